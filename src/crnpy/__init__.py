@@ -1,3 +1,3 @@
 from .factory import create_crn
 
-__all__ = ["legacy", "crn", "create_crn"]
\ No newline at end of file
+__all__ = ["legacy", "crn", "parallel", "create_crn"]
\ No newline at end of file
@@ -1 +1 @@
-__all__ = ["utils", "crn_class", "random", "token"]
\ No newline at end of file
+__all__ = ["utils", "crn_class", "random", "token", "mass_action", "batch", "ensemble", "cache", "store", "pipeline"]
\ No newline at end of file
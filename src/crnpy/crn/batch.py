@@ -0,0 +1,67 @@
+import numpy as np
+from typing import Sequence
+
+# A columnar batch packs many CRNs into zero-padded stacked arrays, keyed like CRN.to_dict:
+#   species                 - (batch, max_number_of_species) species names, padded with ''
+#   reaction_rates          - (batch, max_number_of_reactions)
+#   reaction_stoichiometry  - (batch, max_number_of_reactions, max_number_of_species)
+#   product_stoichiometry   - (batch, max_number_of_reactions, max_number_of_species)
+#   initial_concentrations  - (batch, max_number_of_species)
+#   number_of_species       - (batch, ) number of unpadded species of each member
+#   number_of_reactions     - (batch, ) number of unpadded reactions of each member
+
+def stack_crns(crns: Sequence, max_number_of_species: int =None, max_number_of_reactions: int =None):
+    # packs a sequence of CRN objects into a columnar batch
+    number_of_species = np.asarray([crn.number_of_species for crn in crns], dtype=np.int64)
+    number_of_reactions = np.asarray([crn.number_of_reactions for crn in crns], dtype=np.int64)
+
+    if max_number_of_species is None:
+        max_number_of_species = int(np.max(number_of_species, initial=0))
+    if max_number_of_reactions is None:
+        max_number_of_reactions = int(np.max(number_of_reactions, initial=0))
+
+    if np.any(number_of_species > max_number_of_species):
+        raise ValueError('A CRN has more species than max_number_of_species.')
+    if np.any(number_of_reactions > max_number_of_reactions):
+        raise ValueError('A CRN has more reactions than max_number_of_reactions.')
+
+    batch_size = len(crns)
+    species = np.full((batch_size, max_number_of_species), '', dtype=object)
+    reaction_rates = np.zeros((batch_size, max_number_of_reactions))
+    reaction_stoichiometry = np.zeros((batch_size, max_number_of_reactions, max_number_of_species), dtype=np.int32)
+    product_stoichiometry = np.zeros((batch_size, max_number_of_reactions, max_number_of_species), dtype=np.int32)
+    initial_concentrations = np.zeros((batch_size, max_number_of_species))
+
+    for b, crn in enumerate(crns):
+        n_s = crn.number_of_species
+        n_r = crn.number_of_reactions
+        species[b, :n_s] = crn.species
+        reaction_rates[b, :n_r] = crn.reaction_rates
+        reaction_stoichiometry[b, :n_r, :n_s] = crn.reaction_stoichiometry
+        product_stoichiometry[b, :n_r, :n_s] = crn.product_stoichiometry
+        initial_concentrations[b, :n_s] = crn.initial_concentrations
+
+    return {
+        "species": species.astype(str),
+        "reaction_rates": reaction_rates,
+        "reaction_stoichiometry": reaction_stoichiometry,
+        "product_stoichiometry": product_stoichiometry,
+        "initial_concentrations": initial_concentrations,
+        "number_of_species": number_of_species,
+        "number_of_reactions": number_of_reactions,
+    }
+
+def unstack_batch(batch: dict):
+    # splits a columnar batch into one dict per member with the padding removed, as accepted by CRN.from_dict
+    members = []
+    for b in range(len(batch["number_of_species"])):
+        n_s = batch["number_of_species"][b]
+        n_r = batch["number_of_reactions"][b]
+        members.append({
+            "species": batch["species"][b, :n_s],
+            "reaction_rates": batch["reaction_rates"][b, :n_r],
+            "reaction_stoichiometry": batch["reaction_stoichiometry"][b, :n_r, :n_s],
+            "product_stoichiometry": batch["product_stoichiometry"][b, :n_r, :n_s],
+            "initial_concentrations": batch["initial_concentrations"][b, :n_s],
+        })
+    return members
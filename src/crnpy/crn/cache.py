@@ -0,0 +1,145 @@
+import hashlib
+import os
+import numpy as np
+from collections import OrderedDict
+from scipy.optimize import OptimizeResult
+from typing import Optional
+
+# scalar fields of a solve_ivp result that are cached next to t, y, t_events and y_events; the dense output sol is not
+_SCALAR_FIELDS = ("status", "message", "nfev", "njev", "nlu")
+
+def _from_solution(sol):
+    fields = {"t": np.array(sol.t), "y": np.array(sol.y)}
+    for name in ("t_events", "y_events"):
+        events = sol.get(name)
+        fields[name] = None if events is None else [np.array(e) for e in events]
+    for name in _SCALAR_FIELDS:
+        fields[name] = sol.get(name)
+    return fields
+
+def _fields_nbytes(fields: dict):
+    yield fields["t"].nbytes + fields["y"].nbytes
+    for name in ("t_events", "y_events"):
+        if fields[name] is not None:
+            yield sum(e.nbytes for e in fields[name])
+
+def _to_result(fields: dict):
+    result = OptimizeResult({name: fields[name] for name in _SCALAR_FIELDS})
+    result.t = fields["t"].copy()
+    result.y = fields["y"].copy()
+    for name in ("t_events", "y_events"):
+        result[name] = None if fields[name] is None else [e.copy() for e in fields[name]]
+    result.sol = None
+    result.success = result.status >= 0
+    return result
+
+def _to_npz(fields: dict):
+    arrays = {"t": fields["t"], "y": fields["y"]}
+    for name in _SCALAR_FIELDS:
+        arrays[name] = np.asarray(fields[name])
+    for name in ("t_events", "y_events"):
+        events = fields[name]
+        arrays[name + "_count"] = np.asarray(-1 if events is None else len(events))
+        for i, e in enumerate(events or []):
+            arrays[name + "_" + str(i)] = e
+    return arrays
+
+def _from_npz(data):
+    fields = {"t": data["t"], "y": data["y"]}
+    fields["status"] = int(data["status"])
+    fields["message"] = str(data["message"])
+    for name in ("nfev", "njev", "nlu"):
+        fields[name] = int(data[name])
+    for name in ("t_events", "y_events"):
+        count = int(data[name + "_count"])
+        fields[name] = None if count < 0 else [data[name + "_" + str(i)] for i in range(count)]
+    return fields
+
+class TrajectoryCache:
+    # Opt-in cache of integrated trajectories, keyed by the content of a CRN and the solver settings.
+    # Trajectories are kept in an in-memory LRU limited to max_bytes and, when directory is given, also written
+    # to an on-disk tier of one .npz file per key, so they survive between processes and sessions.
+    def __init__(self, max_bytes: int =256*1024**2, directory: Optional[str] =None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, crn, t_length: float, t_step: float, method: str ='RK45', rtol: float =1e-9):
+        settings = repr((float(t_length), float(t_step), method, float(rtol)))
+        return crn.fingerprint + '_' + hashlib.blake2b(settings.encode(), digest_size=8).hexdigest()
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+        }
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _store_in_memory(self, key: str, fields: dict):
+        entry_bytes = sum(_fields_nbytes(fields))
+        if entry_bytes > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key)[1]
+
+        while self.current_bytes + entry_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted[1]
+            self.evictions += 1
+
+        self._entries[key] = (fields, entry_bytes)
+        self.current_bytes += entry_bytes
+
+    def get(self, key: str):
+        # returns the cached solution as an OptimizeResult with the fields of the solve_ivp result, or None on a miss.
+        # The arrays are fresh writable copies, so a hit can be used exactly like a newly integrated solution.
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _to_result(self._entries[key][0])
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            with np.load(self._path(key)) as data:
+                fields = _from_npz(data)
+            self._store_in_memory(key, fields)
+            self.disk_hits += 1
+            return _to_result(fields)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, sol):
+        # stores a solve_ivp solution; the cache keeps its own copies of the arrays
+        fields = _from_solution(sol)
+        self._store_in_memory(key, fields)
+
+        if self.directory is not None:
+            # written under a temporary name first so an interrupted job never leaves a partial file behind
+            tmp_path = self._path(key) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **_to_npz(fields))
+            os.replace(tmp_path, self._path(key))
+
+    def clear(self, disk: bool =False):
+        self._entries.clear()
+        self.current_bytes = 0
+        if disk and self.directory is not None:
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, filename))
@@ -1,8 +1,16 @@
 from typing import Sequence, Optional
+import hashlib
 import numpy as np
-from .utils import read_crn_txt, convert_arrays_to_crn_text, save_crn, simulate_trajectory
-from .random import create_stoichiometry_matrices
-from .token import parse_matrices_into_tuples, parse_tuples_into_matrix
+from .utils import read_crn_txt, convert_arrays_to_crn_text, write_crn_text, simulate_trajectory
+from .random import create_stoichiometry_matrices, create_random_batch
+from .token import parse_matrices_into_tuples, parse_tuples_into_matrix, detokenize_batch
+from .mass_action import MassActionRHS
+from .ensemble import sweep
+from .batch import unstack_batch
+
+# attributes that define a CRN; they are stored as read-only copies, and re-assigning any of them invalidates the cached
+# fingerprint and right-hand side
+_DEFINING_ATTRIBUTES = ('species', 'reaction_rates', 'reaction_stoichiometry', 'product_stoichiometry', 'initial_concentrations', 'stoichiometry_matrix')
 
 class CRN:
     def __init__(self, species: Sequence[str], 
@@ -43,8 +51,6 @@ class CRN:
 
         self.stoichiometry_matrix =  product_stoichiometry - reaction_stoichiometry
 
-        self.__hash__()
-
         # creates a dict lookup for O(1) finiding the species index
         species_lookup = {}
         for i, s in enumerate(self.species):
@@ -78,6 +84,15 @@ class CRN:
 
         return cls(np.asarray(species), np.asarray(reaction_rates), react_stoch, prod_stoch, initial_concentrations =initial_concs_vec)
 
+    @classmethod
+    def from_random_batch(cls, number_of_crns: int, number_of_species: int, number_of_reactions: int, reaction_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, product_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, *, seed=None, processes: int = 1, block_size: int = 256, as_batch: bool = False):
+        # reproducible batch version of from_random, see random.create_random_batch
+        # as_batch - return the columnar batch of stacked arrays instead of a list of CRN objects
+        batch = create_random_batch(number_of_crns, number_of_species, number_of_reactions, reaction_molecularity_ratio, product_molecularity_ratio, seed=seed, processes=processes, block_size=block_size)
+        if as_batch:
+            return batch
+        return [cls.from_dict(member) for member in unstack_batch(batch)]
+
     @classmethod
     def from_tokens(cls, stoichiometry_tokens, rate_tokens, initial_concentrations_tokens, inv_vocab):
         number_of_reactions = len(rate_tokens)
@@ -93,6 +108,16 @@ class CRN:
 
         return cls(np.asarray(species), rate_tokens, reaction_stoichiometry, product_stoichiometry, initial_concentrations =initial_concentrations_tokens)
 
+    @classmethod
+    def from_tokens_batch(cls, stoichiometry_tokens, rate_tokens, initial_concentrations_tokens, vocab, *, as_batch=False):
+        # batch version of from_tokens for (batch, max_number_of_reaction) model outputs, see token.detokenize_batch
+        # vocab - a ReactionVocab (create_implicit_vocab)
+        # as_batch - return the columnar batch of stacked arrays instead of a list of CRN objects
+        batch = detokenize_batch(stoichiometry_tokens, rate_tokens, initial_concentrations_tokens, vocab)
+        if as_batch:
+            return batch
+        return [cls.from_dict(member) for member in unstack_batch(batch)]
+
     @classmethod
     def from_dict(cls, d):
         return cls(
@@ -116,22 +141,73 @@ class CRN:
         return convert_arrays_to_crn_text(self.species, self.reaction_rates, self.reaction_stoichiometry, self.product_stoichiometry, self.initial_concentrations)
     
     def __repr__(self):
-        return convert_arrays_to_crn_text(self.species, self.reaction_rates, self.reaction_stoichiometry, self.product_stoichiometry, self.initial_concentrations)
+        # bounded summary, so that logging or displaying a large CRN stays cheap; use str() for the full text
+        return 'CRN(number_of_species=' + str(self.number_of_species) + ', number_of_reactions=' + str(self.number_of_reactions) + ')'
     
+    def __setattr__(self, name, value):
+        if name in _DEFINING_ATTRIBUTES:
+            # the fingerprint and the compiled mass-action right-hand side are derived lazily from these attributes, so
+            # in-place edits, which could not invalidate them, raise instead; re-assign a modified copy to change a CRN
+            value = np.array(value)
+            value.flags.writeable = False
+            object.__setattr__(self, '_fingerprint', None)
+            object.__setattr__(self, '_mass_action_rhs', None)
+        object.__setattr__(self, name, value)
+
+    @property
+    def fingerprint(self):
+        # deterministic blake2b digest of the CRN content, stable across processes and sessions.
+        # Numeric arrays contribute their dtype, shape and bytes; species contribute their names, so the width of the
+        # numpy string dtype does not matter.
+        if self._fingerprint is None:
+            h = hashlib.blake2b(digest_size=16)
+            h.update('\x00'.join(str(s) for s in self.species).encode('utf-8'))
+            for arr in (self.reaction_rates, self.reaction_stoichiometry, self.product_stoichiometry, self.initial_concentrations):
+                arr = np.ascontiguousarray(arr)
+                h.update(b'|' + arr.dtype.str.encode() + str(arr.shape).encode() + b'|')
+                h.update(arr.tobytes())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @property
+    def crn_id(self):
+        return int(self.fingerprint[:15], 16)
+
     def __hash__(self):
-        key_str =  str(hash(self.reaction_stoichiometry.data.tobytes())) + str(hash(self.product_stoichiometry.data.tobytes())) + str(hash(self.species.data.tobytes())) + str(hash(self.reaction_rates.data.tobytes())) + str(hash(self.initial_concentrations.data.tobytes()))
-        self.crn_id  = hash(key_str)
-        return self.crn_id 
+        return self.crn_id
 
     def save(self, filename: str=None):
         if filename is None:
             filename = str('crn_') + str(self.crn_id) + '.txt'
-        save_crn(filename, str(self))
-
-    def integrate(self, t_length, t_step):
-        return simulate_trajectory( self.reaction_rates, self.reaction_stoichiometry, self.stoichiometry_matrix, self.initial_concentrations, t_length, t_step)
+        with open(filename, "w") as f:
+            write_crn_text(f, self.species, self.reaction_rates, self.reaction_stoichiometry, self.product_stoichiometry, self.initial_concentrations)
+
+    @property
+    def mass_action_rhs(self):
+        if self._mass_action_rhs is None:
+            self._mass_action_rhs = MassActionRHS(self.reaction_rates, self.reaction_stoichiometry, self.stoichiometry_matrix)
+        return self._mass_action_rhs
+
+    def integrate(self, t_length, t_step, method='RK45', cache=None):
+        # cache - optional TrajectoryCache, re-using the trajectory of an identical CRN integrated with the same settings
+        if cache is not None:
+            key = cache.key(self, t_length, t_step, method)
+            sol = cache.get(key)
+            if sol is not None:
+                return sol
+
+        sol = simulate_trajectory( self.reaction_rates, self.reaction_stoichiometry, self.stoichiometry_matrix, self.initial_concentrations, t_length, t_step, method=method, rhs=self.mass_action_rhs)
+
+        if cache is not None:
+            cache.put(key, sol)
+        return sol
     
-    def distance_from(self, other_crn, species_to_compare, t_length, t_step):
+    def sweep(self, t_length, t_step, *, reaction_rates=None, initial_concentrations=None, method='RK45', processes=None, chunksize=64):
+        # integrates this topology for every row of reaction_rates (points, reactions) and/or initial_concentrations (points, species),
+        # sharing the compiled right-hand side. Returns (t, y, blowup) with y indexed by sweep point, see ensemble.sweep
+        return sweep(self.mass_action_rhs, self.initial_concentrations, t_length, t_step, reaction_rates=reaction_rates, sweep_initial_concentrations=initial_concentrations, method=method, processes=processes, chunksize=chunksize)
+
+    def distance_from(self, other_crn, species_to_compare, t_length, t_step, method='RK45', cache=None):
 
         if not set(species_to_compare).issubset(set(self.species)):
             raise ValueError('species_to_compare are not present in crn object A.')
@@ -139,8 +215,8 @@ class CRN:
         if not set(species_to_compare).issubset(set(other_crn.species)):
             raise ValueError('species_to_compare are not present in crn object B.')
     
-        sol_self = self.integrate(t_length, t_step)
-        sol_other = other_crn.integrate(t_length, t_step)
+        sol_self = self.integrate(t_length, t_step, method=method, cache=cache)
+        sol_other = other_crn.integrate(t_length, t_step, method=method, cache=cache)
 
         self_idx = np.asarray([ self.species_lookup[s_to_compare] for s_to_compare in species_to_compare ])
         other_idx = np.asarray([ other_crn.species_lookup[s_to_compare] for s_to_compare in species_to_compare ])
@@ -161,53 +237,50 @@ class CRN:
     def tokenize(self, vocab, max_number_of_species, max_number_of_reaction):
         list_of_reaction_tuples = parse_matrices_into_tuples(self.reaction_stoichiometry, self.product_stoichiometry, self.number_of_reactions)
         stoichiometry_tokens = [ vocab[_] for _ in list_of_reaction_tuples ]
-        rate_tokens = self.reaction_rates
-        initial_concentrations_tokens = self.initial_concentrations
-
-        if self.number_of_species < max_number_of_species:
-            for _ in range(max_number_of_species - self.number_of_species):
-                initial_concentrations_tokens = np.append(initial_concentrations_tokens, 0)
 
-        if self.number_of_reactions < max_number_of_reaction:
-            for _ in range(max_number_of_reaction - self.number_of_reactions):
-                stoichiometry_tokens+= [0]
-                rate_tokens = np.append(rate_tokens, 0)
+        # pads in one step rather than re-allocating for every padding token
+        initial_concentrations_tokens = np.pad(self.initial_concentrations, (0, max(max_number_of_species - self.number_of_species, 0)))
+        rate_tokens = np.pad(self.reaction_rates, (0, max(max_number_of_reaction - self.number_of_reactions, 0)))
+        stoichiometry_tokens += [0]*max(max_number_of_reaction - self.number_of_reactions, 0)
 
         return (stoichiometry_tokens, rate_tokens, initial_concentrations_tokens)
     
     def reduce(self):
-        # identifies reactions with the same reactant and product stoichiometry and sums their rates, setting the rate of the duplicate reaction to 0
-        _reaction_rates = self.reaction_rates        
-        for r1 in range(self.number_of_reactions):
-            for r2 in range(r1+1, self.number_of_reactions):
-                if np.all(self.reaction_stoichiometry[r1, :] == self.reaction_stoichiometry[r2, :]) and np.all(self.product_stoichiometry[r1, :] == self.product_stoichiometry[r2, :]):
-                    _reaction_rates[r1] = _reaction_rates[r1] + _reaction_rates[r2]
-                    _reaction_rates[r2] = 0
-                    
-        self.reaction_rates = _reaction_rates
-
-        # identifies reactions where the reactant and product stoichiometry are the same and sets their rate to 0
-        for r in range(self.number_of_reactions):
-            if np.all(self.reaction_stoichiometry[r, :] == self.product_stoichiometry[r, :]):
-                self.reaction_rates[r] = 0
-
-        # removes reactions with 0 rate and updates the stoichiometry matrix and number of reactions accordingly
-        arg_reactions = np.argwhere(self.reaction_rates > 0).flatten()
-        self.reaction_rates = self.reaction_rates[arg_reactions]
-        self.reaction_stoichiometry = self.reaction_stoichiometry[arg_reactions, :]
-        self.product_stoichiometry = self.product_stoichiometry[arg_reactions, :]
-        self.stoichiometry_matrix = self.product_stoichiometry - self.reaction_stoichiometry
-        self.number_of_reactions = len(self.reaction_rates)
+        # identifies reactions with the same reactant and product stoichiometry and sums their rates into the first occurrence
+        # rows are grouped with np.unique, so the cost is a sort of the reactions rather than a comparison of every pair
+        reaction_complexes = np.concatenate([self.reaction_stoichiometry, self.product_stoichiometry], axis=1)
+        if self.number_of_reactions > 0:
+            _, first_reaction, reaction_group = np.unique(reaction_complexes, axis=0, return_index=True, return_inverse=True)
+            summed_rates = np.bincount(reaction_group.ravel(), weights=self.reaction_rates, minlength=first_reaction.size)
+        else:
+            first_reaction = np.zeros(0, dtype=np.int64)
+            summed_rates = np.zeros(0)
 
-        # identifies species that are not involved in any reaction and removes them, updating the stoichiometry matrix and number of species accordingly
-        arg_species = [s for s in range(self.number_of_species) if not (np.all(self.reaction_stoichiometry[:, s] == 0) and np.all(self.product_stoichiometry[:, s] == 0))]
+        # keeps the reactions in their original order, as a new array so the caller's reaction_rates are left untouched
+        order = np.argsort(first_reaction)
+        arg_reactions = first_reaction[order]
+        _reaction_rates = summed_rates[order].astype(self.reaction_rates.dtype)
 
+        # removes reactions where the reactant and product stoichiometry are the same, and reactions with 0 rate
+        is_self_loop = np.all(self.reaction_stoichiometry[arg_reactions, :] == self.product_stoichiometry[arg_reactions, :], axis=1)
+        keep = np.logical_and(_reaction_rates > 0, ~is_self_loop)
+
+        arg_reactions = arg_reactions[keep]
+        reaction_stoichiometry = self.reaction_stoichiometry[arg_reactions, :]
+        product_stoichiometry = self.product_stoichiometry[arg_reactions, :]
+
+        # identifies species that are not involved in any reaction and removes them
+        arg_species = np.flatnonzero(np.logical_or(np.any(reaction_stoichiometry != 0, axis=0), np.any(product_stoichiometry != 0, axis=0)))
+
+        self.reaction_rates = _reaction_rates[keep]
         self.initial_concentrations = self.initial_concentrations[arg_species]
         self.species = self.species[arg_species]
-        self.reaction_stoichiometry = self.reaction_stoichiometry[:, arg_species]
-        self.product_stoichiometry = self.product_stoichiometry[:, arg_species]
+        self.reaction_stoichiometry = reaction_stoichiometry[:, arg_species]
+        self.product_stoichiometry = product_stoichiometry[:, arg_species]
         self.stoichiometry_matrix = self.product_stoichiometry - self.reaction_stoichiometry
-        self.number_of_species = len(self.species) 
+        self.number_of_reactions = len(self.reaction_rates)
+        self.number_of_species = len(self.species)
+        self.species_lookup = {s: i for i, s in enumerate(self.species)}
 
 
 
@@ -0,0 +1,181 @@
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.sparse import diags
+from scipy.spatial.distance import cdist
+from typing import Sequence, Union, Optional
+from .utils import MAX_VAL, IMPLICIT_METHODS, simulate_trajectory
+from .mass_action import MassActionRHS
+from .batch import unstack_batch
+from ..parallel import map_chunks
+
+def _member_rhs_and_inits(crns: Union[Sequence, dict]):
+    # accepts either CRN objects, reusing their compiled right-hand sides, or a columnar batch
+    if isinstance(crns, dict):
+        members = unstack_batch(crns)
+        rhs_list = [MassActionRHS(m["reaction_rates"], m["reaction_stoichiometry"], m["product_stoichiometry"] - m["reaction_stoichiometry"]) for m in members]
+        inits = [m["initial_concentrations"] for m in members]
+    else:
+        rhs_list = [crn.mass_action_rhs for crn in crns]
+        inits = [crn.initial_concentrations for crn in crns]
+    return rhs_list, inits
+
+def integrate_batch(crns: Union[Sequence, dict], t_length: float, t_step: float, rtol: float =1e-9, method: str ='RK45'):
+    # integrates many CRNs in a single solve_ivp call by stacking them into one block-diagonal mass-action system
+    # crns - sequence of CRN objects, or a columnar batch (see batch.stack_crns). Mixed numbers of species are padded.
+    # returns (t, y, blowup)
+    #   t - (time, ) time points, np.arange(0, t_length, t_step) as for CRN.integrate
+    #   y - (batch, max_number_of_species, time) trajectories, NaN from the first time point a member exceeds MAX_VAL
+    #   blowup - (batch, ) bool flags of the members that exceeded MAX_VAL
+    # Members that blow up are frozen rather than stopping the whole batch; the solve terminates once all have blown up.
+    # A failure of the solver itself raises a RuntimeError rather than being reported as blowup.
+    rhs_list, inits = _member_rhs_and_inits(crns)
+    batch_size = len(rhs_list)
+    max_number_of_species = max([rhs.number_of_species for rhs in rhs_list], default=0)
+
+    _t_eval = np.arange(0, t_length, t_step)
+    y = np.full((batch_size, max_number_of_species, _t_eval.size), np.nan)
+    if batch_size == 0 or max_number_of_species == 0:
+        return (_t_eval, y, np.zeros(batch_size, dtype=bool))
+
+    block_rhs = MassActionRHS.block_diagonal(rhs_list, max_number_of_species)
+    initial_concs = np.zeros((batch_size, max_number_of_species))
+    for b, init in enumerate(inits):
+        initial_concs[b, :len(init)] = init
+
+    def blown_members(x):
+        return np.max(np.abs(x.reshape(batch_size, max_number_of_species)), axis=1) >= MAX_VAL
+
+    def fun(t, x):
+        dx = block_rhs(t, x).reshape(batch_size, max_number_of_species)
+        dx[blown_members(x), :] = 0
+        return dx.ravel()
+
+    def jac(t, x):
+        active = np.repeat(~blown_members(x), max_number_of_species).astype(float)
+        return (diags(active) @ block_rhs.jacobian(t, x)).tocsc()
+
+    def all_blowup_event(t, x):
+        return MAX_VAL - np.min(np.max(np.abs(x.reshape(batch_size, max_number_of_species)), axis=1))
+
+    all_blowup_event.terminal = True
+    all_blowup_event.direction = -1
+
+    solver_kwargs = {}
+    if method in IMPLICIT_METHODS:
+        solver_kwargs['jac'] = jac
+
+    sol = solve_ivp(fun, [0, t_length], initial_concs.ravel(), method=method, t_eval=_t_eval, rtol=rtol, events=all_blowup_event, **solver_kwargs)
+    if sol.status < 0:
+        raise RuntimeError('integrate_batch: the solver failed at t=' + str(sol.t[-1] if sol.t.size > 0 else 0.0) + ': ' + sol.message)
+
+    number_of_time_points = sol.y.shape[1]
+    y[:, :, :number_of_time_points] = sol.y.reshape(batch_size, max_number_of_species, number_of_time_points)
+
+    # time points at or after each member's blowup are masked out
+    is_blown = np.max(np.abs(np.nan_to_num(y, nan=MAX_VAL)), axis=1) >= MAX_VAL
+    is_blown = np.logical_or.accumulate(is_blown, axis=1)
+    y[np.broadcast_to(is_blown[:, np.newaxis, :], y.shape)] = np.nan
+    blowup = is_blown[:, -1] if _t_eval.size > 0 else np.zeros(batch_size, dtype=bool)
+
+    return (_t_eval, y, blowup)
+
+def _pad_trajectory(sol, number_of_time_points: int):
+    # copies a (possibly terminated) solve_ivp solution into a fixed (species, time) array, padding with NaN
+    y = np.full((sol.y.shape[0], number_of_time_points), np.nan)
+    y[:, :sol.y.shape[1]] = sol.y
+    return y
+
+def _sweep_chunk(rhs: MassActionRHS, rate_chunk: np.ndarray, initial_concentration_chunk: np.ndarray, t_length: float, t_step: float, rtol: float, method: str):
+    # integrates one chunk of sweep points; module level so that it can be sent to worker processes
+    number_of_time_points = np.arange(0, t_length, t_step).size
+    y = np.empty((rate_chunk.shape[0], rhs.number_of_species, number_of_time_points))
+    blowup = np.zeros(rate_chunk.shape[0], dtype=bool)
+    for i in range(rate_chunk.shape[0]):
+        sol = simulate_trajectory(None, None, None, initial_concentration_chunk[i], t_length, t_step, rtol=rtol, method=method, rhs=rhs.with_rates(rate_chunk[i]))
+        y[i] = _pad_trajectory(sol, number_of_time_points)
+        blowup[i] = sol.status == 1
+    return (y, blowup)
+
+def sweep(rhs: MassActionRHS, initial_concentrations: Sequence[float], t_length: float, t_step: float, *, reaction_rates: Optional[np.ndarray] =None, sweep_initial_concentrations: Optional[np.ndarray] =None, rtol: float =1e-9, method: str ='RK45', processes: Optional[int] =None, chunksize: int =64):
+    # integrates one network topology over many rate and/or initial-concentration vectors
+    # rhs - compiled right-hand side of the topology, its rates are used when reaction_rates is None
+    # initial_concentrations - used when sweep_initial_concentrations is None
+    # reaction_rates - (points, num_of_reactions) rate vector of each sweep point
+    # sweep_initial_concentrations - (points, num_of_species) initial concentrations of each sweep point
+    # processes - number of worker processes, None uses every core and 1 runs in this process
+    # chunksize - number of sweep points sent to a worker at a time
+    # returns (t, y, blowup) with y of shape (points, num_of_species, time), laid out as in integrate_batch
+    if reaction_rates is None and sweep_initial_concentrations is None:
+        raise ValueError('Must specify reaction_rates and/or sweep_initial_concentrations.')
+
+    if reaction_rates is not None:
+        reaction_rates = np.atleast_2d(np.asarray(reaction_rates, dtype=float))
+        if reaction_rates.shape[1] != rhs.number_of_reactions:
+            raise ValueError('reaction_rates must have one column per reaction.')
+
+    if sweep_initial_concentrations is not None:
+        sweep_initial_concentrations = np.atleast_2d(np.asarray(sweep_initial_concentrations, dtype=float))
+        if sweep_initial_concentrations.shape[1] != rhs.number_of_species:
+            raise ValueError('sweep_initial_concentrations must have one column per species.')
+
+    if reaction_rates is None:
+        reaction_rates = np.broadcast_to(rhs.reaction_rates, (sweep_initial_concentrations.shape[0], rhs.number_of_reactions))
+    if sweep_initial_concentrations is None:
+        sweep_initial_concentrations = np.broadcast_to(np.asarray(initial_concentrations, dtype=float), (reaction_rates.shape[0], rhs.number_of_species))
+
+    if reaction_rates.shape[0] != sweep_initial_concentrations.shape[0]:
+        raise ValueError('reaction_rates and sweep_initial_concentrations must have the same number of sweep points.')
+
+    number_of_points = reaction_rates.shape[0]
+    _t_eval = np.arange(0, t_length, t_step)
+    starts = range(0, number_of_points, chunksize)
+    chunk_args = [(rhs, reaction_rates[s:s+chunksize], sweep_initial_concentrations[s:s+chunksize], t_length, t_step, rtol, method) for s in starts]
+
+    results = map_chunks(_sweep_chunk, chunk_args, processes)
+
+    y = np.empty((number_of_points, rhs.number_of_species, _t_eval.size))
+    blowup = np.zeros(number_of_points, dtype=bool)
+    for s, (y_chunk, blowup_chunk) in zip(starts, results):
+        y[s:s+chunksize] = y_chunk
+        blowup[s:s+chunksize] = blowup_chunk
+
+    return (_t_eval, y, blowup)
+
+def _integrate_chunk(rhs_list: Sequence[MassActionRHS], inits: Sequence[np.ndarray], t_length: float, t_step: float, rtol: float, method: str):
+    # integrates a chunk of networks, returning each (species, time) trajectory truncated at blowup as by CRN.integrate
+    return [simulate_trajectory(None, None, None, init, t_length, t_step, rtol=rtol, method=method, rhs=rhs).y for rhs, init in zip(rhs_list, inits)]
+
+def distance_matrix(crns: Sequence, species_to_compare: Sequence[str], t_length: float, t_step: float, *, rtol: float =1e-9, method: str ='RK45', processes: Optional[int] =None, chunksize: int =16):
+    # population version of CRN.distance_from, integrating each CRN once rather than twice per pair
+    # returns (mse, mse_ends, change_in_val), each (num_of_crns, num_of_crns) with entry [i, j] equal to
+    # crns[i].distance_from(crns[j], ...). Pairs whose trajectories differ in length (blowup) are infinite.
+    # processes - number of worker processes used to integrate, None uses every core and 1 runs in this process
+    for i, crn in enumerate(crns):
+        if not set(species_to_compare).issubset(set(crn.species)):
+            raise ValueError('species_to_compare are not present in crn object ' + str(i) + '.')
+
+    starts = range(0, len(crns), chunksize)
+    chunk_args = [([crn.mass_action_rhs for crn in crns[s:s+chunksize]], [crn.initial_concentrations for crn in crns[s:s+chunksize]], t_length, t_step, rtol, method) for s in starts]
+    solutions = [y for chunk in map_chunks(_integrate_chunk, chunk_args, processes) for y in chunk]
+
+    trajectories = [y[np.asarray([crn.species_lookup[s] for s in species_to_compare]), :] for crn, y in zip(crns, solutions)]
+    lengths = np.asarray([traj.shape[1] for traj in trajectories])
+
+    number_of_crns = len(crns)
+    mse = np.full((number_of_crns, number_of_crns), np.inf)
+    mse_ends = np.full((number_of_crns, number_of_crns), np.inf)
+    change_in_val = np.full((number_of_crns, number_of_crns), np.inf)
+
+    # only trajectories of the same length are comparable, so each length forms its own block
+    for length in np.unique(lengths):
+        group = np.flatnonzero(lengths == length)
+        block = np.ix_(group, group)
+        group_trajectories = np.stack([trajectories[i] for i in group])
+
+        flat = group_trajectories.reshape(group.size, -1)
+        ends = group_trajectories[:, :, -1]
+        mse[block] = cdist(flat, flat, 'sqeuclidean')/flat.shape[1]
+        mse_ends[block] = cdist(ends, ends, 'sqeuclidean')/ends.shape[1]
+        change_in_val[block] = np.mean(np.abs(group_trajectories[:, :, 0] - group_trajectories[:, :, -1]), axis=1)[:, np.newaxis]
+
+    return (mse, mse_ends, change_in_val)
@@ -0,0 +1,94 @@
+import copy
+import numpy as np
+from scipy.sparse import csr_matrix
+from typing import Sequence
+
+class MassActionRHS:
+    # Compiled mass-action right-hand side, equivalent to utils.stoch_mat_to_mass_action but built once per CRN.
+    # Only the nonzero (reaction, species, exponent) triples of the reactant stoichiometry are stored, and the
+    # net-change matrix is kept in CSR form, so a call costs O(nonzeros) rather than O(reactions x species).
+    def __init__(self, reaction_rates: Sequence[float], react_stoch: Sequence[int], stoch_mat: Sequence[int]):
+        react_stoch = np.asarray(react_stoch)
+        stoch_mat = np.asarray(stoch_mat)
+
+        self.number_of_reactions, self.number_of_species = react_stoch.shape
+        self.reaction_rates = np.asarray(reaction_rates, dtype=float)
+
+        # np.nonzero walks the matrix row by row, so the triples come out grouped by reaction
+        self.reaction_idx, self.species_idx = np.nonzero(react_stoch)
+        self.exponents = react_stoch[self.reaction_idx, self.species_idx].astype(float)
+
+        # reactions with at least one reactant, and where each of their segments of triples starts
+        self.segment_reactions, self.segment_starts = np.unique(self.reaction_idx, return_index=True)
+
+        # (num_of_species, num_of_reactions) net change applied by each reaction
+        self.net_change = csr_matrix(stoch_mat.T)
+
+    @classmethod
+    def block_diagonal(cls, rhs_list: Sequence['MassActionRHS'], species_block_size: int =None):
+        # combines several right-hand sides into one block-diagonal system whose state is the concatenation of the
+        # members' states. species_block_size pads every member to the same number of species, so the state can be
+        # reshaped to (num_of_members, species_block_size)
+        if species_block_size is None:
+            species_block_size = max(rhs.number_of_species for rhs in rhs_list)
+
+        reaction_offsets = np.cumsum([0] + [rhs.number_of_reactions for rhs in rhs_list])
+        species_offsets = species_block_size*np.arange(len(rhs_list))
+
+        block = cls.__new__(cls)
+        block.number_of_reactions = int(reaction_offsets[-1])
+        block.number_of_species = species_block_size*len(rhs_list)
+        block.reaction_rates = np.concatenate([rhs.reaction_rates for rhs in rhs_list])
+        block.reaction_idx = np.concatenate([rhs.reaction_idx + offset for rhs, offset in zip(rhs_list, reaction_offsets)])
+        block.species_idx = np.concatenate([rhs.species_idx + offset for rhs, offset in zip(rhs_list, species_offsets)])
+        block.exponents = np.concatenate([rhs.exponents for rhs in rhs_list])
+        block.segment_reactions, block.segment_starts = np.unique(block.reaction_idx, return_index=True)
+
+        net_change_coo = [rhs.net_change.tocoo() for rhs in rhs_list]
+        net_change_data = np.concatenate([coo.data for coo in net_change_coo])
+        net_change_rows = np.concatenate([coo.row + offset for coo, offset in zip(net_change_coo, species_offsets)])
+        net_change_cols = np.concatenate([coo.col + offset for coo, offset in zip(net_change_coo, reaction_offsets)])
+        block.net_change = csr_matrix((net_change_data, (net_change_rows, net_change_cols)), shape=(block.number_of_species, block.number_of_reactions))
+        return block
+
+    def with_rates(self, reaction_rates: Sequence[float]):
+        # returns a copy sharing the precomputed stoichiometry structure but with different reaction rates
+        rhs = copy.copy(self)
+        rhs.reaction_rates = np.asarray(reaction_rates, dtype=float)
+        return rhs
+
+    def fluxes(self, x: Sequence[float]):
+        # rate of every reaction, k_r * prod_s x_s^a_rs
+        fluxes = self.reaction_rates.copy()
+        if self.segment_reactions.size > 0:
+            conc_to_power_of_react = np.power(np.asarray(x, dtype=float)[self.species_idx], self.exponents)
+            fluxes[self.segment_reactions] *= np.multiply.reduceat(conc_to_power_of_react, self.segment_starts)
+        return fluxes
+
+    def __call__(self, t: float, x: Sequence[float]):
+        # t is ignored as mass-action kinetics produce autonomous ODEs
+        return self.net_change @ self.fluxes(x)
+
+    def jacobian(self, t: float, x: Sequence[float]):
+        # sparse (num_of_species, num_of_species) Jacobian of the right-hand side
+        x = np.asarray(x, dtype=float)
+        if self.segment_reactions.size == 0:
+            return csr_matrix((self.number_of_species, self.number_of_species))
+
+        conc = x[self.species_idx]
+        conc_to_power_of_react = np.power(conc, self.exponents)
+
+        # product of the other reactant terms of each triple's reaction, without dividing by a zero term
+        is_zero = conc_to_power_of_react == 0
+        nonzero_terms = np.where(is_zero, 1.0, conc_to_power_of_react)
+        segment_prod = np.multiply.reduceat(nonzero_terms, self.segment_starts)
+        segment_zeros = np.add.reduceat(is_zero.astype(int), self.segment_starts)
+        segment_of_triple = np.repeat(np.arange(self.segment_starts.size), np.diff(np.append(self.segment_starts, self.reaction_idx.size)))
+        other_zeros = segment_zeros[segment_of_triple] - is_zero
+        other_terms = np.where(other_zeros == 0, segment_prod[segment_of_triple]/nonzero_terms, 0.0)
+
+        d_conc_to_power_of_react = self.exponents*np.power(conc, self.exponents - 1)
+        d_fluxes = self.reaction_rates[self.reaction_idx]*d_conc_to_power_of_react*other_terms
+
+        d_fluxes_mat = csr_matrix((d_fluxes, (self.reaction_idx, self.species_idx)), shape=(self.number_of_reactions, self.number_of_species))
+        return (self.net_change @ d_fluxes_mat).tocsc()
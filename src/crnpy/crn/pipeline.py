@@ -0,0 +1,73 @@
+import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from .random import create_random_batch
+from .ensemble import integrate_batch
+from .token import ReactionVocab, create_implicit_vocab, tokenize_batch
+
+def make_training_batch(seed_sequence: np.random.SeedSequence, batch_size:int, number_of_species:int, number_of_reactions:int, t_length: float, t_step: float, vocab: ReactionVocab, max_number_of_species:int, max_number_of_reaction:int, reaction_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, product_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, rtol: float =1e-9, method: str ='RK45', filter_blowup: bool =True):
+    # one generate -> integrate -> tokenize step; module level so it can run in worker processes
+    # returns (stoichiometry_tokens, rate_tokens, initial_concentrations_tokens, targets), see tokenize_batch, with
+    #   targets - (batch, max_number_of_species, time) float32 trajectories, NaN after a blowup when filter_blowup is False
+    # filter_blowup - drop the members whose trajectories exceed MAX_VAL, so a yielded batch can be smaller than batch_size
+    batch = create_random_batch(batch_size, number_of_species, number_of_reactions, reaction_molecularity_ratio, product_molecularity_ratio, seed=seed_sequence, processes=1, block_size=max(batch_size, 1))
+    _, y, blowup = integrate_batch(batch, t_length, t_step, rtol=rtol, method=method)
+    stoichiometry_tokens, rate_tokens, initial_concentrations_tokens = tokenize_batch(batch, vocab, max_number_of_species, max_number_of_reaction)
+
+    targets = np.zeros((batch_size, max_number_of_species, y.shape[2]), dtype=np.float32)
+    targets[:, :y.shape[1], :] = y
+
+    if filter_blowup:
+        keep = ~blowup
+        return (stoichiometry_tokens[keep], rate_tokens[keep], initial_concentrations_tokens[keep], targets[keep])
+    return (stoichiometry_tokens, rate_tokens, initial_concentrations_tokens, targets)
+
+def training_batches(batch_size:int, number_of_species:int, number_of_reactions:int, t_length: float, t_step: float, *, number_of_batches: Optional[int] =None, vocab: Optional[ReactionVocab] =None, max_number_of_species: Optional[int] =None, max_number_of_reaction: Optional[int] =None, reaction_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, product_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, rtol: float =1e-9, method: str ='RK45', filter_blowup: bool =True, seed=None, processes: Optional[int] =None, max_pending_batches: Optional[int] =None):
+    # generator of ready training batches (see make_training_batch), produced by a pool of worker processes while the
+    # consumer works on the previous ones. At most max_pending_batches batches (default 2 per process) are in flight,
+    # so a slow consumer holds back the producers instead of letting finished batches pile up in memory.
+    # number_of_batches - None for an endless stream
+    # vocab - ReactionVocab to tokenize with, by default create_implicit_vocab(number_of_species, molecularity) with the
+    #         largest molecularity of reaction_molecularity_ratio and product_molecularity_ratio
+    # seed - int or np.random.SeedSequence. Batch i is generated from the i-th spawned SeedSequence and batches are
+    #        yielded in order, so a given seed gives the same stream whatever the number of processes
+    # processes - number of worker processes, None uses every core and 1 runs every step in this process
+    if vocab is None:
+        vocab, _ = create_implicit_vocab(number_of_species, max(max(reaction_molecularity_ratio), max(product_molecularity_ratio)))
+    if max_number_of_species is None:
+        max_number_of_species = number_of_species
+    if max_number_of_reaction is None:
+        max_number_of_reaction = number_of_reactions
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if max_pending_batches is None:
+        max_pending_batches = 2*processes
+
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    step_args = (batch_size, number_of_species, number_of_reactions, t_length, t_step, vocab, max_number_of_species, max_number_of_reaction, reaction_molecularity_ratio, product_molecularity_ratio, rtol, method, filter_blowup)
+
+    def batch_seeds():
+        i = 0
+        while number_of_batches is None or i < number_of_batches:
+            yield seed_sequence.spawn(1)[0]
+            i += 1
+
+    if processes == 1:
+        for batch_seed in batch_seeds():
+            yield make_training_batch(batch_seed, *step_args)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=processes)
+    pending = deque()
+    try:
+        for batch_seed in batch_seeds():
+            if len(pending) >= max_pending_batches:
+                yield pending.popleft().result()
+            pending.append(executor.submit(make_training_batch, batch_seed, *step_args))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # also reached when the consumer stops iterating early, cancelling whatever has not started yet
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -1,5 +1,10 @@
 import numpy as np
 import itertools
+from math import comb
+from ..parallel import map_chunks
+
+# above this many enumerated species tuples create_stoichiometry_matrices switches to sample_stoichiometry_matrices
+MAX_ENUMERATED_TUPLES = 100000
 
 def iterate_all_molecularity_tuples(number_of_species:int, molecularity:int):
     positions = list(range(number_of_species))
@@ -10,14 +15,9 @@ def iterate_all_molecularity_tuples(number_of_species:int, molecularity:int):
     
     return all_combinations
 
-def create_stoichiometry_matrices(number_of_reactions:int , number_of_species:int , molecularity_ratio: dict):
-    # inits an empty matrix
-    mat = np.zeros((number_of_reactions, number_of_species))
-
-    # extracts molecularity data
+def _select_molecularities(number_of_reactions:int, molecularity_ratio: dict, random_state=np.random):
+    # randomly selects the molecularity of each reaction according to the (unnormalised) ratios
     molecularities = np.asarray(list(molecularity_ratio.keys()))
-    molecularity_pairs = iterate_all_molecularity_tuples(number_of_species, np.max(molecularities))
-
     ratios = np.asarray(list(molecularity_ratio.values()))
 
     # normalises the ratios
@@ -25,9 +25,23 @@ def create_stoichiometry_matrices(number_of_reactions:int , number_of_species:in
     norm_ratios = np.divide(ratios, ratio_sum)
     indices = np.arange(len(ratios))
 
+    selected_molecularities_idx = random_state.choice(indices, size=number_of_reactions, p=norm_ratios)
+    return molecularities[selected_molecularities_idx]
+
+def create_stoichiometry_matrices(number_of_reactions:int , number_of_species:int , molecularity_ratio: dict):
+    max_molecularity = int(np.max(np.asarray(list(molecularity_ratio.keys()))))
+    if comb(number_of_species + max_molecularity - 1, max_molecularity) > MAX_ENUMERATED_TUPLES:
+        # enumerating every tuple would need O(number_of_species^molecularity) memory
+        return sample_stoichiometry_matrices(number_of_reactions, number_of_species, molecularity_ratio)
+
+    # inits an empty matrix
+    mat = np.zeros((number_of_reactions, number_of_species))
+
+    # extracts molecularity data
+    molecularity_pairs = iterate_all_molecularity_tuples(number_of_species, max_molecularity)
+
     # randomly selects the reaction type of each reaction according to the ratios 
-    selected_molecularities_idx = np.random.choice(indices, size=number_of_reactions, p=norm_ratios)
-    selected_molecularities = np.asarray([molecularities[idx] for idx in selected_molecularities_idx])
+    selected_molecularities = _select_molecularities(number_of_reactions, molecularity_ratio)
 
     # populates the matrix
     for r in range(number_of_reactions):
@@ -38,3 +52,72 @@ def create_stoichiometry_matrices(number_of_reactions:int , number_of_species:in
             mat[r,s] += 1
 
     return mat.astype(np.int32)
+
+def _sample_sorted_subsets(number_of_subsets:int, population:int, subset_size:int, random_state=np.random):
+    # draws number_of_subsets uniform subsets of range(population), each of subset_size distinct values, returned sorted
+    # row by row. Uses Robert Floyd's algorithm vectorised over the subsets: O(number_of_subsets * subset_size) memory.
+    subsets = np.zeros((number_of_subsets, subset_size), dtype=np.int64)
+    for i, j in enumerate(range(population - subset_size, population)):
+        t = np.floor(random_state.random(number_of_subsets)*(j + 1)).astype(np.int64)
+        already_chosen = np.any(subsets[:, :i] == t[:, np.newaxis], axis=1)
+        subsets[:, i] = np.where(already_chosen, j, t)
+    subsets.sort(axis=1)
+    return subsets
+
+def sample_stoichiometry_matrices(number_of_reactions:int , number_of_species:int , molecularity_ratio: dict, random_state=np.random):
+    # same distribution as create_stoichiometry_matrices, i.e. a molecularity drawn from the ratios and then a uniform
+    # multiset of that many species, without enumerating the multisets.
+    # A multiset of m species corresponds (stars and bars) to a set c_0 < ... < c_{m-1} drawn from range(number_of_species + m - 1),
+    # with the multiset elements c_i - i, so uniform sets give uniform multisets in O(number_of_reactions * m) memory.
+    # random_state - np.random (global state, default), a np.random.RandomState or a np.random.Generator
+    mat = np.zeros((number_of_reactions, number_of_species), dtype=np.int32)
+    selected_molecularities = _select_molecularities(number_of_reactions, molecularity_ratio, random_state)
+
+    for molecularity in np.unique(selected_molecularities):
+        reactions = np.flatnonzero(selected_molecularities == molecularity)
+        if molecularity == 0:
+            continue
+        subsets = _sample_sorted_subsets(reactions.size, number_of_species + molecularity - 1, molecularity, random_state)
+        species_idx = subsets - np.arange(molecularity)
+        np.add.at(mat, (np.repeat(reactions, molecularity), species_idx.ravel()), 1)
+
+    return mat
+
+def _create_random_block(seed_sequence: np.random.SeedSequence, number_of_crns:int, number_of_species:int, number_of_reactions:int, reaction_molecularity_ratio: dict, product_molecularity_ratio: dict):
+    # generates one block of random CRNs from its own independent stream; module level so it can run in worker processes
+    rng = np.random.default_rng(seed_sequence)
+    reaction_rates = rng.lognormal(size=(number_of_crns, number_of_reactions))
+    initial_concentrations = rng.lognormal(size=(number_of_crns, number_of_species))
+    reaction_stoichiometry = sample_stoichiometry_matrices(number_of_crns*number_of_reactions, number_of_species, reaction_molecularity_ratio, random_state=rng)
+    product_stoichiometry = sample_stoichiometry_matrices(number_of_crns*number_of_reactions, number_of_species, product_molecularity_ratio, random_state=rng)
+    shape = (number_of_crns, number_of_reactions, number_of_species)
+    return (reaction_rates, initial_concentrations, reaction_stoichiometry.reshape(shape), product_stoichiometry.reshape(shape))
+
+def create_random_batch(number_of_crns:int, number_of_species:int, number_of_reactions:int, reaction_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, product_molecularity_ratio: dict = {0: 1, 1: 1, 2: 1}, seed=None, processes:int =1, block_size:int =256):
+    # generates number_of_crns random CRNs, distributed as CRN.from_random, as a columnar batch (see batch.stack_crns)
+    # seed - int, np.random.SeedSequence or np.random.Generator. Every block of block_size CRNs is generated from its own
+    #        SeedSequence-spawned stream, so a given seed and block_size give the same batch whatever the number of processes
+    # processes - number of worker processes, None uses every core and 1 runs in this process
+    if isinstance(seed, np.random.Generator):
+        seed = seed.integers(2**63)
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    block_starts = list(range(0, number_of_crns, block_size))
+    block_seeds = seed_sequence.spawn(len(block_starts))
+    chunk_args = [(block_seed, min(block_size, number_of_crns - start), number_of_species, number_of_reactions, reaction_molecularity_ratio, product_molecularity_ratio) for block_seed, start in zip(block_seeds, block_starts)]
+    blocks = map_chunks(_create_random_block, chunk_args, processes)
+
+    if len(blocks) == 0:
+        blocks = [_create_random_block(seed_sequence, 0, number_of_species, number_of_reactions, reaction_molecularity_ratio, product_molecularity_ratio)]
+    reaction_rates, initial_concentrations, reaction_stoichiometry, product_stoichiometry = [np.concatenate(arrays) for arrays in zip(*blocks)]
+
+    species = np.asarray(['S_'+ str(_+1) for _ in range(number_of_species)])
+    return {
+        "species": np.broadcast_to(species, (number_of_crns, number_of_species)).copy(),
+        "reaction_rates": reaction_rates,
+        "reaction_stoichiometry": reaction_stoichiometry,
+        "product_stoichiometry": product_stoichiometry,
+        "initial_concentrations": initial_concentrations,
+        "number_of_species": np.full(number_of_crns, number_of_species, dtype=np.int64),
+        "number_of_reactions": np.full(number_of_crns, number_of_reactions, dtype=np.int64),
+    }
@@ -0,0 +1,189 @@
+import json
+import os
+import numpy as np
+from typing import Sequence, Union
+from .crn_class import CRN
+from .batch import unstack_batch
+
+# Columnar on-disk store for many CRNs. A store is a directory with a meta.json file and one raw binary file per column:
+#   reaction_offsets, species_offsets, entry_offsets - (num_of_crns + 1, ) int64 start of each CRN in the columns below
+#   reaction_rates                                   - float64, one value per reaction
+#   initial_concentrations                           - float64, one value per species
+#   species_ids                                      - int32, one value per species, indexing the species name table in meta.json
+#   entry_reaction, entry_species                    - int32, CRN-local (reaction, species) of each nonzero stoichiometry entry
+#   entry_reactant, entry_product                    - int32, reactant and product stoichiometry of each entry
+# Columns are appended in chunks and read back through memory maps, so reads do not copy the data.
+
+_COLUMNS = {
+    "reaction_offsets": np.int64,
+    "species_offsets": np.int64,
+    "entry_offsets": np.int64,
+    "reaction_rates": np.float64,
+    "initial_concentrations": np.float64,
+    "species_ids": np.int32,
+    "entry_reaction": np.int32,
+    "entry_species": np.int32,
+    "entry_reactant": np.int32,
+    "entry_product": np.int32,
+}
+
+_OFFSET_COLUMNS = ("reaction_offsets", "species_offsets", "entry_offsets")
+
+class CRNStore:
+    def __init__(self, path: str, mode: str ='r'):
+        # mode - 'r' to read an existing store, 'a' to append (creating the store if needed), 'w' to create an empty store
+        if mode not in ('r', 'a', 'w'):
+            raise ValueError("mode must be one of 'r', 'a' or 'w'")
+
+        self.path = path
+        self.mode = mode
+        self._memmaps = {}
+
+        if mode == 'w' or (mode == 'a' and not os.path.exists(self._meta_path())):
+            os.makedirs(path, exist_ok=True)
+            self.meta = {"version": 1, "number_of_crns": 0, "lengths": {name: 0 for name in _COLUMNS}, "species_names": []}
+            for name in _COLUMNS:
+                open(self._column_path(name), 'wb').close()
+            self._append_column("reaction_offsets", np.zeros(1))
+            self._append_column("species_offsets", np.zeros(1))
+            self._append_column("entry_offsets", np.zeros(1))
+            self._write_meta()
+        else:
+            with open(self._meta_path(), 'r') as f:
+                self.meta = json.load(f)
+
+        if mode != 'r':
+            # drops any bytes written by an append that was interrupted before its meta.json update
+            for name, dtype in _COLUMNS.items():
+                with open(self._column_path(name), 'r+b') as f:
+                    f.truncate(self.meta["lengths"][name]*np.dtype(dtype).itemsize)
+
+        self.species_names = np.asarray(self.meta["species_names"], dtype=str)
+        self._species_name_ids = {name: i for i, name in enumerate(self.meta["species_names"])}
+
+    def _meta_path(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def _column_path(self, name: str):
+        return os.path.join(self.path, name + '.bin')
+
+    def _write_meta(self):
+        tmp_path = self._meta_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._meta_path())
+
+    def _append_column(self, name: str, values: np.ndarray):
+        values = np.ascontiguousarray(values, dtype=_COLUMNS[name])
+        with open(self._column_path(name), 'ab') as f:
+            f.write(values.tobytes())
+        self.meta["lengths"][name] += values.size
+
+    def column(self, name: str):
+        # read-only memory map of a whole column
+        if name not in self._memmaps:
+            length = self.meta["lengths"][name]
+            if length == 0:
+                self._memmaps[name] = np.zeros(0, dtype=_COLUMNS[name])
+            else:
+                self._memmaps[name] = np.memmap(self._column_path(name), dtype=_COLUMNS[name], mode='r', shape=(length,))
+        return self._memmaps[name]
+
+    def __len__(self):
+        return self.meta["number_of_crns"]
+
+    def append(self, crns: Union[Sequence[CRN], dict]):
+        # appends a chunk of CRN objects, or a columnar batch (see batch.stack_crns), to the store
+        if self.mode == 'r':
+            raise ValueError('CRNStore was opened read-only.')
+
+        if isinstance(crns, dict):
+            members = unstack_batch(crns)
+        else:
+            members = [crn.to_dict() for crn in crns]
+        if len(members) == 0:
+            return
+
+        reaction_total = self.meta["lengths"]["reaction_rates"]
+        species_total = self.meta["lengths"]["initial_concentrations"]
+        entry_total = self.meta["lengths"]["entry_reaction"]
+
+        chunk = {name: [] for name in _COLUMNS}
+        for m in members:
+            # reshaped because to_dict turns a CRN without reactions into [] stoichiometries
+            shape = (len(m["reaction_rates"]), len(m["species"]))
+            react_stoch = np.asarray(m["reaction_stoichiometry"]).reshape(shape)
+            prod_stoch = np.asarray(m["product_stoichiometry"]).reshape(shape)
+            entry_reaction, entry_species = np.nonzero(np.logical_or(react_stoch != 0, prod_stoch != 0))
+
+            species_ids = [self._species_name_ids.setdefault(str(s), len(self._species_name_ids)) for s in m["species"]]
+
+            reaction_total += len(m["reaction_rates"])
+            species_total += len(species_ids)
+            entry_total += entry_reaction.size
+
+            chunk["reaction_offsets"].append([reaction_total])
+            chunk["species_offsets"].append([species_total])
+            chunk["entry_offsets"].append([entry_total])
+            chunk["reaction_rates"].append(m["reaction_rates"])
+            chunk["initial_concentrations"].append(m["initial_concentrations"])
+            chunk["species_ids"].append(species_ids)
+            chunk["entry_reaction"].append(entry_reaction)
+            chunk["entry_species"].append(entry_species)
+            chunk["entry_reactant"].append(react_stoch[entry_reaction, entry_species])
+            chunk["entry_product"].append(prod_stoch[entry_reaction, entry_species])
+
+        for name in _COLUMNS:
+            self._append_column(name, np.concatenate([np.asarray(values, dtype=_COLUMNS[name]).ravel() for values in chunk[name]]))
+
+        self.meta["number_of_crns"] += len(members)
+        self.meta["species_names"] = list(self._species_name_ids)
+        self._write_meta()
+
+        self.species_names = np.asarray(self.meta["species_names"], dtype=str)
+        self._memmaps = {}
+
+    def arrays(self, key: Union[int, slice]):
+        # zero-copy views of the columns of the i-th CRN, or of a contiguous slice of CRNs, plus their species names.
+        # For a slice, the columns of all its CRNs are returned as single contiguous memmap views, and the
+        # reaction_offsets, species_offsets and entry_offsets entries give the (len + 1, ) start of each CRN within them.
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError('CRNStore.arrays only supports contiguous slices.')
+            stop = max(start, stop)
+        else:
+            start = key + len(self) if key < 0 else key
+            if not 0 <= start < len(self):
+                raise IndexError('CRNStore index out of range')
+            stop = start + 1
+
+        views = {}
+        for offsets, names in [("reaction_offsets", ("reaction_rates",)),
+                               ("species_offsets", ("initial_concentrations", "species_ids")),
+                               ("entry_offsets", ("entry_reaction", "entry_species", "entry_reactant", "entry_product"))]:
+            offset_range = self.column(offsets)[start:stop+1]
+            for name in names:
+                views[name] = self.column(name)[offset_range[0]:offset_range[-1]]
+            if isinstance(key, slice):
+                views[offsets] = offset_range - offset_range[0]
+        views["species"] = self.species_names[views["species_ids"]]
+        return views
+
+    def _crn(self, i: int):
+        views = self.arrays(i)
+        shape = (views["reaction_rates"].size, views["species_ids"].size)
+        reaction_stoichiometry = np.zeros(shape, dtype=np.int32)
+        product_stoichiometry = np.zeros(shape, dtype=np.int32)
+        reaction_stoichiometry[views["entry_reaction"], views["entry_species"]] = views["entry_reactant"]
+        product_stoichiometry[views["entry_reaction"], views["entry_species"]] = views["entry_product"]
+        return CRN(views["species"], np.array(views["reaction_rates"]), reaction_stoichiometry, product_stoichiometry, initial_concentrations=np.array(views["initial_concentrations"]))
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return [self._crn(i) for i in range(*key.indices(len(self)))]
+        return self._crn(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._crn(i)
@@ -1,7 +1,10 @@
 import numpy as np
 import itertools
+from collections.abc import Mapping
+from math import comb
 from .random import iterate_all_molecularity_tuples
-from typing import Sequence
+from typing import Sequence, Union
+from .batch import stack_crns
 
 def all_reaction_tuples(number_of_species:int, molecularity:int):
     all_combs = iterate_all_molecularity_tuples(number_of_species, molecularity)
@@ -19,6 +22,235 @@ def create_vocab(max_number_of_species:int, molecularity:int):
     
     return (vocab, inv_vocab)
 
+def number_of_complexes(number_of_species:int, molecularity:int):
+    # number of multisets of at most molecularity species, i.e. the number of possible reactant (or product) complexes
+    return comb(number_of_species + molecularity, molecularity)
+
+def complex_rank(complex_tuple: tuple, number_of_species:int):
+    # position of a sorted species tuple among all complexes in the order of iterate_all_molecularity_tuples:
+    # by size first, then lexicographically as produced by itertools.combinations_with_replacement
+    n = len(complex_tuple)
+    rank = comb(number_of_species + n - 1, n - 1) if n > 0 else 0
+    previous = 0
+    for i, s in enumerate(complex_tuple):
+        k = n - i - 1
+        # counts the complexes whose i-th species lies in [previous, s), by the hockey-stick identity
+        rank += comb(number_of_species - previous + k, k + 1) - comb(number_of_species - s + k, k + 1)
+        previous = s
+    return rank
+
+def complex_unrank(rank:int, number_of_species:int):
+    # inverse of complex_rank
+    n = 0
+    while comb(number_of_species + n, n) <= rank:
+        n += 1
+    rank -= comb(number_of_species + n - 1, n - 1) if n > 0 else 0
+
+    complex_tuple = ()
+    s = 0
+    for i in range(n):
+        k = n - i - 1
+        count = comb(number_of_species - s + k - 1, k)
+        while rank >= count:
+            rank -= count
+            s += 1
+            count = comb(number_of_species - s + k - 1, k)
+        complex_tuple += (s,)
+    return complex_tuple
+
+class ReactionVocab(Mapping):
+    # Implicit version of the vocab dict of create_vocab, mapping (reactant_tuple, product_tuple) to the same token id
+    # through combinatorial ranking rather than a stored table, so it takes O(1) memory.
+    def __init__(self, number_of_species:int, molecularity:int):
+        self.number_of_species = number_of_species
+        self.molecularity = molecularity
+        self.number_of_complexes = number_of_complexes(number_of_species, molecularity)
+
+    def _is_complex(self, complex_tuple):
+        return (isinstance(complex_tuple, tuple) and len(complex_tuple) <= self.molecularity
+                and all(isinstance(s, (int, np.integer)) and 0 <= s < self.number_of_species for s in complex_tuple)
+                and all(a <= b for a, b in zip(complex_tuple, complex_tuple[1:])))
+
+    def __getitem__(self, reaction_tuple):
+        if not (isinstance(reaction_tuple, tuple) and len(reaction_tuple) == 2 and self._is_complex(reaction_tuple[0]) and self._is_complex(reaction_tuple[1])):
+            raise KeyError(reaction_tuple)
+        reactant_tuple, product_tuple = reaction_tuple
+        return complex_rank(reactant_tuple, self.number_of_species)*self.number_of_complexes + complex_rank(product_tuple, self.number_of_species)
+
+    def __len__(self):
+        return self.number_of_complexes**2
+
+    def __iter__(self):
+        complexes = list(itertools.chain.from_iterable(iterate_all_molecularity_tuples(self.number_of_species, self.molecularity).values()))
+        return itertools.product(complexes, complexes)
+
+    @property
+    def inverse(self):
+        return InverseReactionVocab(self.number_of_species, self.molecularity)
+
+class InverseReactionVocab(Mapping):
+    # Implicit version of the inv_vocab dict of create_vocab, mapping a token id back to (reactant_tuple, product_tuple)
+    def __init__(self, number_of_species:int, molecularity:int):
+        self.number_of_species = number_of_species
+        self.molecularity = molecularity
+        self.number_of_complexes = number_of_complexes(number_of_species, molecularity)
+
+    def __getitem__(self, token):
+        if not isinstance(token, (int, np.integer)) or not 0 <= token < len(self):
+            raise KeyError(token)
+        reactant_rank, product_rank = divmod(int(token), self.number_of_complexes)
+        return (complex_unrank(reactant_rank, self.number_of_species), complex_unrank(product_rank, self.number_of_species))
+
+    def __len__(self):
+        return self.number_of_complexes**2
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+def create_implicit_vocab(max_number_of_species:int, molecularity:int):
+    # drop-in replacement for create_vocab that does not materialise the vocabulary
+    vocab = ReactionVocab(max_number_of_species, molecularity)
+    return (vocab, vocab.inverse)
+
+def _binomial_table(max_n:int, max_k:int):
+    # (max_n + 1, max_k + 1) int64 table of comb(n, k)
+    table = [[comb(n, k) for k in range(max_k + 1)] for n in range(max_n + 1)]
+    if max(max(row) for row in table) > np.iinfo(np.int64).max:
+        raise ValueError('Binomial coefficients of the vocabulary do not fit in int64.')
+    return np.asarray(table, dtype=np.int64)
+
+def complex_ranks(stoichiometry: np.ndarray, number_of_species:int, molecularity:int):
+    # vectorised complex_rank over the rows of a (..., num_of_species) stoichiometry array, without a Python loop per row
+    stoichiometry = np.asarray(stoichiometry)
+    counts = stoichiometry.reshape(-1, stoichiometry.shape[-1])
+    complex_size = np.sum(counts, axis=1)
+    if np.any(complex_size > molecularity):
+        raise ValueError('A complex has more species than the vocabulary molecularity.')
+    if counts.shape[1] > number_of_species:
+        raise ValueError('The stoichiometry has more species than the vocabulary.')
+
+    binomial = _binomial_table(number_of_species + molecularity, molecularity + 1)
+
+    # species at each position of the sorted species tuple: the number of species whose cumulative count is <= position
+    cumulative_counts = np.cumsum(counts, axis=1)
+    positions = np.arange(molecularity)
+    sorted_species = np.sum(cumulative_counts[:, np.newaxis, :] <= positions[np.newaxis, :, np.newaxis], axis=2)
+
+    # offset of all smaller complexes, comb(S + n - 1, n - 1) for n > 0
+    ranks = np.where(complex_size > 0, binomial[number_of_species + complex_size - 1, np.maximum(complex_size - 1, 0)], 0)
+    previous = np.zeros(counts.shape[0], dtype=np.int64)
+    for i in range(molecularity):
+        in_complex = i < complex_size
+        k = np.maximum(complex_size - i - 1, 0)
+        s = np.where(in_complex, sorted_species[:, i], previous)
+        ranks += np.where(in_complex, binomial[number_of_species - previous + k, k + 1] - binomial[number_of_species - s + k, k + 1], 0)
+        previous = s
+
+    return ranks.reshape(stoichiometry.shape[:-1])
+
+def tokenize_batch(crns: Union[Sequence, dict], vocab: ReactionVocab, max_number_of_species:int, max_number_of_reaction:int):
+    # batch version of CRN.tokenize for many CRN objects or a columnar batch (see batch.stack_crns)
+    # vocab - a ReactionVocab (create_implicit_vocab), whose ids equal those of create_vocab
+    # returns (stoichiometry_tokens, rate_tokens, initial_concentrations_tokens) zero-padded to shapes
+    # (batch, max_number_of_reaction), (batch, max_number_of_reaction) and (batch, max_number_of_species).
+    # Tokens are int32, or int64 when the vocabulary does not fit in int32; rates and concentrations are float32.
+    if not isinstance(vocab, ReactionVocab):
+        raise TypeError('vocab must be a ReactionVocab, see create_implicit_vocab')
+    if vocab.number_of_complexes**2 > np.iinfo(np.int64).max:
+        # token ids are computed in int64 arithmetic, which would silently wrap around (len() itself cannot report this size)
+        raise ValueError('The vocabulary is too large for int64 token ids.')
+
+    batch = crns if isinstance(crns, dict) else stack_crns(crns, max_number_of_species, max_number_of_reaction)
+    batch_size, number_of_reactions, number_of_species = batch["reaction_stoichiometry"].shape
+    if number_of_reactions > max_number_of_reaction or number_of_species > max_number_of_species:
+        raise ValueError('The batch is larger than max_number_of_reaction or max_number_of_species.')
+
+    reactant_ranks = complex_ranks(batch["reaction_stoichiometry"], vocab.number_of_species, vocab.molecularity)
+    product_ranks = complex_ranks(batch["product_stoichiometry"], vocab.number_of_species, vocab.molecularity)
+
+    token_dtype = np.int32 if vocab.number_of_complexes**2 <= np.iinfo(np.int32).max else np.int64
+    stoichiometry_tokens = np.zeros((batch_size, max_number_of_reaction), dtype=token_dtype)
+    rate_tokens = np.zeros((batch_size, max_number_of_reaction), dtype=np.float32)
+    initial_concentrations_tokens = np.zeros((batch_size, max_number_of_species), dtype=np.float32)
+
+    stoichiometry_tokens[:, :number_of_reactions] = reactant_ranks*vocab.number_of_complexes + product_ranks
+    rate_tokens[:, :number_of_reactions] = batch["reaction_rates"]
+    initial_concentrations_tokens[:, :number_of_species] = batch["initial_concentrations"]
+
+    return (stoichiometry_tokens, rate_tokens, initial_concentrations_tokens)
+
+def complex_table(ranks: Sequence[int], number_of_species:int, molecularity:int):
+    # (len(ranks), molecularity) lookup table of the sorted species tuple of each complex rank, padded with -1
+    # built with complex_unrank, so its size depends on the ranks asked for rather than on the size of the vocabulary
+    table = np.full((len(ranks), molecularity), -1, dtype=np.int64)
+    for i, rank in enumerate(ranks):
+        complex_tuple = complex_unrank(int(rank), number_of_species)
+        table[i, :len(complex_tuple)] = complex_tuple
+    return table
+
+def parse_tokens_into_matrices_batch(stoichiometry_tokens: np.ndarray, vocab: ReactionVocab, number_of_species:int):
+    # vectorised parse_tuples_into_matrix over a (batch, num_of_reactions) token array
+    # returns (reaction_stoichiometry, product_stoichiometry), each int32 (batch, num_of_reactions, number_of_species)
+    stoichiometry_tokens = np.asarray(stoichiometry_tokens, dtype=np.int64)
+    if np.any(stoichiometry_tokens < 0) or np.any(stoichiometry_tokens >= vocab.number_of_complexes**2):
+        raise ValueError('stoichiometry_tokens contains ids outside of the vocabulary.')
+
+    # only the distinct complexes present in the batch are unranked
+    reactant_ranks, product_ranks = divmod(stoichiometry_tokens, vocab.number_of_complexes)
+    unique_ranks, inverse = np.unique(np.concatenate([reactant_ranks.ravel(), product_ranks.ravel()]), return_inverse=True)
+    table = complex_table(unique_ranks, vocab.number_of_species, vocab.molecularity)
+    reactant_index, product_index = np.split(inverse.ravel(), 2)
+
+    batch_size, number_of_reactions = stoichiometry_tokens.shape
+    reaction_offsets = (np.arange(batch_size*number_of_reactions)*number_of_species).reshape(batch_size, number_of_reactions, 1)
+    size = batch_size*number_of_reactions*number_of_species
+
+    matrices = []
+    for complex_index in (reactant_index, product_index):
+        species = table[complex_index.reshape(stoichiometry_tokens.shape)]
+        if np.any(species >= number_of_species):
+            raise ValueError('stoichiometry_tokens refer to more species than number_of_species.')
+        # scatter-add of every (reaction, species) occurrence through a flat bincount
+        flat = (reaction_offsets + species)[species >= 0]
+        matrices.append(np.bincount(flat, minlength=size).reshape(batch_size, number_of_reactions, number_of_species).astype(np.int32))
+
+    return tuple(matrices)
+
+def detokenize_batch(stoichiometry_tokens: np.ndarray, rate_tokens: np.ndarray, initial_concentrations_tokens: np.ndarray, vocab: ReactionVocab):
+    # decodes padded model outputs into a columnar batch (see batch.stack_crns), the batch version of CRN.from_tokens
+    # padding tokens (0) are stripped and the remaining reactions of each member are moved to the front
+    # initial_concentrations_tokens - (batch, num_of_species), or None for vocab.number_of_species species at concentration 1
+    stoichiometry_tokens = np.asarray(stoichiometry_tokens, dtype=np.int64)
+    rate_tokens = np.asarray(rate_tokens)
+    batch_size = stoichiometry_tokens.shape[0]
+
+    if initial_concentrations_tokens is None:
+        initial_concentrations_tokens = np.ones((batch_size, vocab.number_of_species))
+    initial_concentrations_tokens = np.asarray(initial_concentrations_tokens)
+    number_of_species = initial_concentrations_tokens.shape[1]
+
+    is_reaction = stoichiometry_tokens != 0
+    order = np.argsort(~is_reaction, axis=1, kind='stable')
+    number_of_reactions = np.sum(is_reaction, axis=1)
+    max_number_of_reactions = int(np.max(number_of_reactions, initial=0))
+
+    stoichiometry_tokens = np.take_along_axis(stoichiometry_tokens, order, axis=1)[:, :max_number_of_reactions]
+    rate_tokens = np.take_along_axis(rate_tokens, order, axis=1)[:, :max_number_of_reactions]
+    rate_tokens = np.where(np.arange(max_number_of_reactions) < number_of_reactions[:, np.newaxis], rate_tokens, 0)
+
+    reaction_stoichiometry, product_stoichiometry = parse_tokens_into_matrices_batch(stoichiometry_tokens, vocab, number_of_species)
+    species = np.asarray(['S_'+ str(_+1) for _ in range(number_of_species)])
+
+    return {
+        "species": np.broadcast_to(species, (batch_size, number_of_species)).copy(),
+        "reaction_rates": rate_tokens,
+        "reaction_stoichiometry": reaction_stoichiometry,
+        "product_stoichiometry": product_stoichiometry,
+        "initial_concentrations": initial_concentrations_tokens,
+        "number_of_species": np.full(batch_size, number_of_species, dtype=np.int64),
+        "number_of_reactions": number_of_reactions.astype(np.int64),
+    }
+
 def parse_matrices_into_tuples(reaction_stoichiometry: Sequence[int], product_stoichiometry: Sequence[int], number_of_reactions: int):
     
     crn_tokens = []
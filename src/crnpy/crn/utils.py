@@ -1,10 +1,15 @@
 import numpy as np
 import csv
 from scipy.integrate import solve_ivp
-from typing import Sequence
+from scipy.sparse import coo_matrix
+from typing import Sequence, Iterable
+from .mass_action import MassActionRHS
 
 MAX_VAL = 1e6
 
+# solve_ivp methods that make use of the analytic Jacobian
+IMPLICIT_METHODS = ('BDF', 'Radau', 'LSODA')
+
 def blowup_event(t, y, *args):
     return MAX_VAL - np.max(np.abs(y))
 
@@ -28,75 +33,87 @@ def save_crn(filename: str, txt: str):
     f.write(txt)
     f.close()
 
-def read_crn_txt(filename: str):
-    # Function to parse CRN.txt files to use in python 
-    f = open(filename, "r")
-    species_and_nothing = {''}
+# names that stand for the empty complex, e.g. '0' as written by convert_arrays_to_crn_text
+NOTHING = ('', '0')
+
+def parse_crn_txt(lines: Iterable[str]):
+    # Function to parse the lines of a CRN.txt file in a single streaming pass
+    # species names are interned to column indices as they are first seen and the stoichiometry is collected as
+    # COO (reaction, species) entries, so the cost is linear in the size of the file
+    # returns (species, reaction_rates, react_stoch, prod_stoch, initial_concs) with species in order of first
+    # appearance, react_stoch and prod_stoch as scipy COO matrices, and initial_concs as a dict
+    # raises ValueError with the line number for malformed lines
+    species_lookup = {}
     reaction_rates = []
-    reaction_reacts = []
-    reaction_prods = []
+    react_rows, react_cols = [], []
+    prod_rows, prod_cols = [], []
     initial_concs = {}
-    for x in f:
-        if x.startswith("#"):
-            conc_string = x.replace(' ', '').strip(' \n\t#')
-            split_concs = conc_string.split(",")
-            for conc in split_concs:
-                species_name, conc_val = conc.split("=")
-                if species_name in initial_concs:
-                    conc_val_stored = initial_concs[species_name]
-                    max_conc = max(conc_val_stored, float(conc_val))
-                    initial_concs[species_name]= float(max_conc)
-                else:
-                    initial_concs.update({species_name: float(conc_val)})
-        else:
-            x = x.replace(' ', '').strip(' \n\t')
-            split_comma = x.split(",")
-            rate = float(split_comma[1].strip(' \n\t'))
-            split_arrow = split_comma[0].split("->")
-            reactants = split_arrow[0].split("+")
-            products = split_arrow[1].split("+")
 
-            reaction_rates = reaction_rates + [rate]
+    for line_number, x in enumerate(lines, start=1):
+        x = x.replace(' ', '').strip(' \n\t\r')
+        if not x:
+            continue
 
-            for reactant in reactants:
-                species_and_nothing.add(reactant)
+        if x.startswith("#"):
+            for conc in x.strip('#').split(","):
+                if not conc:
+                    continue
+                species_name, sep, conc_val = conc.partition("=")
+                try:
+                    conc_val = float(conc_val)
+                except ValueError:
+                    sep = ''
+                if not sep or not species_name:
+                    raise ValueError('line ' + str(line_number) + ': malformed initial concentration ' + repr(conc) + ', expected species=value')
+                # repeated species keep the largest concentration
+                initial_concs[species_name] = max(initial_concs.get(species_name, conc_val), conc_val)
+            continue
+
+        reaction, sep, rate = x.rpartition(",")
+        reactants, arrow, products = reaction.partition("->")
+        if not sep or not arrow or "->" in products:
+            raise ValueError('line ' + str(line_number) + ': malformed reaction ' + repr(x) + ', expected reactants->products,rate')
+        try:
+            reaction_rates.append(float(rate))
+        except ValueError:
+            raise ValueError('line ' + str(line_number) + ': malformed reaction rate ' + repr(rate)) from None
+
+        r = len(reaction_rates) - 1
+        for reactant in reactants.split("+"):
+            if reactant not in NOTHING:
+                react_rows.append(r)
+                react_cols.append(species_lookup.setdefault(reactant, len(species_lookup)))
+        for product in products.split("+"):
+            if product not in NOTHING:
+                prod_rows.append(r)
+                prod_cols.append(species_lookup.setdefault(product, len(species_lookup)))
+
+    shape = (len(reaction_rates), len(species_lookup))
+    react_stoch = coo_matrix((np.ones(len(react_rows), dtype=np.int32), (react_rows, react_cols)), shape=shape, dtype=np.int32)
+    prod_stoch = coo_matrix((np.ones(len(prod_rows), dtype=np.int32), (prod_rows, prod_cols)), shape=shape, dtype=np.int32)
+
+    return (list(species_lookup), reaction_rates, react_stoch, prod_stoch, initial_concs)
 
-            for product in products:
-                species_and_nothing.add(product)
+def read_crn_txt(filename: str):
+    # Function to parse CRN.txt files to use in python 
+    with open(filename, "r") as f:
+        species, reaction_rates, react_coo, prod_coo, initial_concs = parse_crn_txt(f)
 
-            reaction_reacts = reaction_reacts + [reactants]
-            reaction_prods = reaction_prods + [products]
-    
-    number_species = len(species_and_nothing) - 1 
-    species = list(species_and_nothing)[1:]
+    number_species = len(species)
     number_reactions = len(reaction_rates)
-    
-    react_stoch = np.zeros(shape=(number_reactions, number_species))
-    prod_stoch = np.zeros(shape=(number_reactions, number_species))
 
-    for r in np.arange(0, number_reactions):
-        reacts_for_react = reaction_reacts[r]
-        prods_for_react = reaction_prods[r]
-        for s in np.arange(0, number_species):
-            react_stoch[r,s] = reacts_for_react.count(species[s])
-            prod_stoch[r,s] = prods_for_react.count(species[s])
+    # species are returned in sorted order, so the COO columns are relabelled before densifying
+    # duplicate COO entries are summed by toarray
+    s_idx = np.argsort(np.asarray(species, dtype=str), kind='stable')
+    sorted_position = np.empty(number_species, dtype=np.int64)
+    sorted_position[s_idx] = np.arange(number_species)
+    _species = [species[i] for i in s_idx]
+    _react_stoch = coo_matrix((react_coo.data, (react_coo.row, sorted_position[react_coo.col])), shape=react_coo.shape).toarray()
+    _prod_stoch = coo_matrix((prod_coo.data, (prod_coo.row, sorted_position[prod_coo.col])), shape=prod_coo.shape).toarray()
+    _stoch_mat = _prod_stoch - _react_stoch
+    _initial_concs_vec = np.asarray([initial_concs.get(species_name, 0.0) for species_name in _species], dtype=float)
 
-    stoch_mat = prod_stoch - react_stoch
-    
-    initial_concs_vec = np.zeros(shape=(number_species,))
-    for species_idx in np.arange(0,len(species)):
-        if species[species_idx] in initial_concs:
-            initial_concs_vec[species_idx] = initial_concs[species[species_idx]]
-
-    _species = np.asarray(species)
-    s_idx = _species.argsort()
-    _species = list(_species[s_idx])
-    _react_stoch = react_stoch[:, s_idx]
-    _prod_stoch = prod_stoch[:, s_idx]
-    _stoch_mat = stoch_mat[:, s_idx]
-    _initial_concs_vec = initial_concs_vec[s_idx]
-
-    return (_species, reaction_rates, _react_stoch.astype(np.int32), _prod_stoch.astype(np.int32), _stoch_mat.astype(np.int32), number_species, number_reactions, _initial_concs_vec )
+    return (_species, reaction_rates, _react_stoch, _prod_stoch, _stoch_mat, number_species, number_reactions, _initial_concs_vec )
 
 def stoch_mat_to_mass_action(t: float, x: Sequence[float], reaction_rates: Sequence[float], react_stoch: Sequence[int], stoch_mat: Sequence[int]):
     # Function that converts a stoichiometry matrix into a reaction-rate equation 
@@ -111,6 +128,24 @@ def stoch_mat_to_mass_action(t: float, x: Sequence[float], reaction_rates: Seque
     mass_action = np.matmul(np.transpose(stoch_mat), fluxes_with_rates)
     return mass_action
 
+def mass_action_jacobian(t: float, x: Sequence[float], reaction_rates: Sequence[float], react_stoch: Sequence[int], stoch_mat: Sequence[int]):
+    # Function that returns the exact Jacobian (num_of_species, num_of_species) of stoch_mat_to_mass_action
+    # d flux_r / d x_s = k_r * a_rs * x_s^(a_rs - 1) * prod_{j != s} x_j^a_rj
+    # the product over the other species is built from prefix and suffix products, so zero concentrations do not cause a division by zero
+    x = np.asarray(x, dtype=float)
+    react_stoch = np.asarray(react_stoch)
+    conc_to_power_of_react = np.power(x, react_stoch)
+
+    prefix_prod = np.ones(conc_to_power_of_react.shape)
+    prefix_prod[:, 1:] = np.cumprod(conc_to_power_of_react[:, :-1], axis=1)
+    suffix_prod = np.ones(conc_to_power_of_react.shape)
+    suffix_prod[:, :-1] = np.cumprod(conc_to_power_of_react[:, :0:-1], axis=1)[:, ::-1]
+
+    d_conc_to_power_of_react = react_stoch*np.power(x, np.maximum(react_stoch - 1, 0))
+    d_fluxes_with_rates = np.asarray(reaction_rates)[:, np.newaxis]*d_conc_to_power_of_react*prefix_prod*suffix_prod
+    jacobian = np.matmul(np.transpose(stoch_mat), d_fluxes_with_rates)
+    return jacobian
+
 def new_initial_conditions(old_inits: Sequence[float], species: Sequence[str], dict: dict):
     new_inits = []
     id_dict = {}
@@ -122,10 +157,11 @@ def new_initial_conditions(old_inits: Sequence[float], species: Sequence[str], d
         id_dict[species[s]] = s
     return new_inits, id_dict
 
-def simulate_trajectory_from_file(crn_file: str, t_length: float, t_step: float, init_dict: dict ={}):
+def simulate_trajectory_from_file(crn_file: str, t_length: float, t_step: float, init_dict: dict ={}, method: str ='RK45'):
     # crn_file - string to .txt file in the CRN format
     # t_length - float for time period of trajectory
     # init_dict - a dict that overwrties the initial concentrations {'X_1':2, 'X_2': 2}
+    # method - solve_ivp integration method, see simulate_trajectory
 
     # reads the previously saved chemical reaction network file returning the key stoichiometry and kinetic matrices 
     species, reaction_rates, react_stoch, prod_stoch, stoch_mat, number_species, number_reactions, initial_concs = read_crn_txt(crn_file)
@@ -134,46 +170,67 @@ def simulate_trajectory_from_file(crn_file: str, t_length: float, t_step: float,
     if len(init_dict.keys()) > 0:
         initial_concs, id_dict = new_initial_conditions(initial_concs, species, init_dict)
     
-    return simulate_trajectory(reaction_rates, react_stoch, stoch_mat, initial_concs, t_length, t_step, rtol=1e-8)
+    return simulate_trajectory(reaction_rates, react_stoch, stoch_mat, initial_concs, t_length, t_step, rtol=1e-8, method=method)
 
-def simulate_trajectory(reaction_rates: Sequence[float], react_stoch: Sequence[int], stoch_mat: Sequence[int], initial_concs: Sequence[float], t_length: float, t_step: float, rtol:float =1e-9):
+def simulate_trajectory(reaction_rates: Sequence[float], react_stoch: Sequence[int], stoch_mat: Sequence[int], initial_concs: Sequence[float], t_length: float, t_step: float, rtol:float =1e-9, method: str ='RK45', rhs: MassActionRHS =None):
     # t_length - float for time period of trajectory
     # t_step - time points to view the trajectory
-
-    # groups stoichiometry matrices for use in ODE simulation 
-    args_crn = (reaction_rates, react_stoch, stoch_mat,)
+    # method - solve_ivp integration method. The implicit methods in IMPLICIT_METHODS (BDF, Radau, LSODA) are given the
+    #          exact mass-action Jacobian and should be used for stiff networks, e.g. from_random with lognormal rates
+    # rhs - optional precompiled MassActionRHS of the same network, used in place of stoch_mat_to_mass_action
 
     # time points to view the trajectory
     _t_eval =  np.arange(0, t_length, t_step)
 
-    sol_crn = solve_ivp(stoch_mat_to_mass_action, [0, t_length], initial_concs, args=args_crn, t_eval=_t_eval, rtol=rtol, events=blowup_event)
+    if rhs is None:
+        # groups stoichiometry matrices for use in ODE simulation 
+        fun = stoch_mat_to_mass_action
+        jac = mass_action_jacobian
+        args_crn = (reaction_rates, react_stoch, stoch_mat,)
+    else:
+        fun = rhs
+        jac = rhs.jacobian
+        args_crn = None
+
+    # the Jacobian is only passed to the methods that use it, as solve_ivp warns otherwise
+    solver_kwargs = {}
+    if method in IMPLICIT_METHODS:
+        solver_kwargs['jac'] = jac
+
+    sol_crn = solve_ivp(fun, [0, t_length], initial_concs, method=method, args=args_crn, t_eval=_t_eval, rtol=rtol, events=blowup_event, **solver_kwargs)
     return sol_crn
 
-def convert_arrays_to_crn_text(species: Sequence[str], reaction_rates: Sequence[float], reaction_stoichiometry: Sequence[int], product_stoichiometry: Sequence[int], initial_concentrations: Sequence[float] ):
-    
-    s = '#'
+def _complex_strings(species_names: np.ndarray, stoichiometry: np.ndarray):
+    # renders the complex of every reaction, e.g. 'X_1 + Y_1 + Y_1', using only the nonzero stoichiometry entries
+    stoichiometry = np.asarray(stoichiometry)
+    reaction_idx, species_idx = np.nonzero(stoichiometry)
+    counts = stoichiometry[reaction_idx, species_idx]
+    names = np.repeat(species_names[species_idx], counts).tolist()
+    ends = np.cumsum(np.bincount(reaction_idx, weights=counts, minlength=stoichiometry.shape[0]).astype(np.int64)).tolist()
+
+    complexes = []
+    start = 0
+    for end in ends:
+        complexes.append(" + ".join(names[start:end]) if end > start else "0")
+        start = end
+    return complexes
+
+def iter_crn_text(species: Sequence[str], reaction_rates: Sequence[float], reaction_stoichiometry: Sequence[int], product_stoichiometry: Sequence[int], initial_concentrations: Sequence[float] ):
+    # yields the lines of the human-readable CRN text format, starting with the '#' initial concentrations line
+    species_names = np.asarray(species).astype(str)
+    if species_names.size > 0:
+        yield '#' + ','.join([name + '=' + conc for name, conc in zip(species_names.tolist(), np.asarray(initial_concentrations).astype(str).tolist())]) + '\n'
+    else:
+        yield '\n'
+
+    reactants = _complex_strings(species_names, reaction_stoichiometry)
+    products = _complex_strings(species_names, product_stoichiometry)
+    for reactants_str, product_str, rate in zip(reactants, products, np.asarray(reaction_rates).astype(str).tolist()):
+        yield reactants_str + '->' + product_str + ',' + rate + '\n'
+
+def write_crn_text(f, species: Sequence[str], reaction_rates: Sequence[float], reaction_stoichiometry: Sequence[int], product_stoichiometry: Sequence[int], initial_concentrations: Sequence[float] ):
+    # streams the CRN text format straight to an open file handle
+    f.writelines(iter_crn_text(species, reaction_rates, reaction_stoichiometry, product_stoichiometry, initial_concentrations))
 
-    for s_id, species_str in enumerate(species):
-        s+= species_str +'='+str(initial_concentrations[s_id])+','
-    
-    s = s[:-1]
-    s += '\n'
-
-    for r_id, rate in enumerate(reaction_rates):
-    # Build reactant string
-        reactants_list = []
-        product_list = []
-        for s_id, species_str in enumerate(species):
-            stoichiometry_react = reaction_stoichiometry[r_id, s_id]
-            stoichiometry_product = product_stoichiometry[r_id, s_id]
-            for _ in range(stoichiometry_react):
-                reactants_list.append(species_str)
-            for _ in range(stoichiometry_product):
-                product_list.append(species_str)
-        
-        reactants_str = " + ".join(reactants_list) if reactants_list else "0"
-        product_str = " + ".join(product_list) if product_list else "0"
-
-        s+= reactants_str + '->'+product_str+','+str(rate) +'\n'
-
-    return s
+def convert_arrays_to_crn_text(species: Sequence[str], reaction_rates: Sequence[float], reaction_stoichiometry: Sequence[int], product_stoichiometry: Sequence[int], initial_concentrations: Sequence[float] ):
+    return ''.join(iter_crn_text(species, reaction_rates, reaction_stoichiometry, product_stoichiometry, initial_concentrations))
@@ -1 +1 @@
-__all__ = ["tools", "stochastic"]
\ No newline at end of file
+__all__ = ["tools", "stochastic", "fsp"]
\ No newline at end of file
@@ -0,0 +1,125 @@
+import numpy as np
+from crnpy.legacy import tools
+from scipy.sparse import csc_matrix, diags
+from scipy.sparse.linalg import spsolve, expm_multiply
+
+# Finite State Projection (Munsky & Khammash, J. Chem. Phys. 124, 044104 (2006)) of the chemical master equation.
+# Reactant and product matrices, rates and null_index follow the conventions of stochastic.py, states are molecule
+# numbers without the null species, and the projection keeps the states reachable from a start state in which every
+# species has fewer than n_max molecules.
+
+def _state_codes(states, n_max):
+    # mixed-radix integer code of every state, used to look states up with searchsorted
+    number_of_species = states.shape[-1];
+    if float(n_max)**number_of_species >= 2**62:
+        raise ValueError('n_max**number_of_species is too large for the finite state projection.');
+    return states @ (n_max ** np.arange(number_of_species, dtype=np.int64))
+
+def enumerate_states(start_state, reactant_matrix, product_matrix, reaction_rates, null_index, n_max):
+    # breadth-first search of the states reachable from start_state through reactions with positive propensity,
+    # keeping only states with fewer than n_max molecules of every species
+    # returns a (number_of_states, species) int64 array of states, sorted by their code
+    propensity_function = tools.stochastic_propensity_function(reactant_matrix, reaction_rates, null_index);
+    state_change = np.delete(np.asarray(product_matrix) - np.asarray(reactant_matrix), null_index, 1).astype(np.int64);
+
+    frontier = np.array([start_state], dtype=np.int64);
+    if np.any(frontier < 0) or np.any(frontier >= n_max):
+        raise ValueError('start_state must have fewer than n_max molecules of every species.');
+    seen_codes = _state_codes(frontier, n_max);
+    all_states = [frontier];
+
+    while frontier.shape[0] > 0:
+        can_fire = propensity_function(frontier) > 0;
+        targets = (frontier[:, np.newaxis, :] + state_change[np.newaxis, :, :])[can_fire];
+        targets = targets[np.all(np.logical_and(targets >= 0, targets < n_max), axis=1)];
+        target_codes, first_index = np.unique(_state_codes(targets, n_max), return_index=True);
+        is_new = ~np.isin(target_codes, seen_codes);
+        frontier = targets[first_index[is_new]];
+        seen_codes = np.concatenate([seen_codes, target_codes[is_new]]);
+        all_states.append(frontier);
+
+    states = np.concatenate(all_states);
+    return states[np.argsort(_state_codes(states, n_max))]
+
+def cme_generator(states, reactant_matrix, product_matrix, reaction_rates, null_index, n_max):
+    # sparse (number_of_states, number_of_states) generator A of the projected master equation dp/dt = A p, with the
+    # falling-factorial propensities of tools.compute_stoichiometry_terms_stochastic_propensity
+    # The diagonal holds minus the total propensity of each state, so probability flowing to states outside the
+    # projection is lost. outflow holds that rate for every state.
+    # returns (generator, outflow)
+    states = np.asarray(states, dtype=np.int64);
+    number_of_states = states.shape[0];
+    propensities = tools.stochastic_propensity_function(reactant_matrix, reaction_rates, null_index)(states);
+    state_change = np.delete(np.asarray(product_matrix) - np.asarray(reactant_matrix), null_index, 1).astype(np.int64);
+
+    codes = _state_codes(states, n_max);
+    source, reaction = np.nonzero(propensities > 0);
+    targets = states[source] + state_change[reaction];
+    in_bounds = np.all(np.logical_and(targets >= 0, targets < n_max), axis=1);
+    target_codes = _state_codes(targets, n_max);
+    target_index = np.minimum(np.searchsorted(codes, target_codes), number_of_states - 1);
+    in_projection = np.logical_and(in_bounds, codes[target_index] == target_codes);
+
+    rates = propensities[source, reaction];
+    outflow = np.bincount(source[~in_projection], weights=rates[~in_projection], minlength=number_of_states);
+    total_propensity = np.sum(propensities, axis=1);
+
+    rows = np.concatenate([target_index[in_projection], np.arange(number_of_states)]);
+    cols = np.concatenate([source[in_projection], np.arange(number_of_states)]);
+    values = np.concatenate([rates[in_projection], -total_propensity]);
+    generator = csc_matrix((values, (rows, cols)), shape=(number_of_states, number_of_states));
+    return (generator, outflow)
+
+def solve_stationary(generator, outflow):
+    # stationary distribution of the projection with the outflow reflected back into its source states
+    # truncation_error is the fraction of the stationary probability flux that would leave the projection
+    # returns (p, truncation_error)
+    number_of_states = generator.shape[0];
+    reflecting_generator = (generator + diags(outflow)).tolil();
+    # one balance equation is redundant and is replaced by the normalisation sum(p) = 1
+    reflecting_generator[number_of_states - 1, :] = np.ones(number_of_states);
+    rhs = np.zeros(number_of_states);
+    rhs[-1] = 1;
+    p = np.atleast_1d(spsolve(reflecting_generator.tocsc(), rhs));
+    p = np.maximum(p, 0);
+    p = p / np.sum(p);
+
+    total_flux = -p @ generator.diagonal();
+    truncation_error = (p @ outflow) / total_flux if total_flux > 0 else 0.0;
+    return (p, truncation_error)
+
+def solve_transient(generator, p0, tRun):
+    # distribution at time tRun of the projected master equation started from p0
+    # truncation_error = 1 - sum(p) bounds the error of every state's probability (FSP theorem)
+    # returns (p, truncation_error)
+    p = expm_multiply(generator * tRun, np.asarray(p0, dtype=float));
+    p = np.maximum(p, 0);
+    return (p, 1 - np.sum(p))
+
+def marginal_distribution(states, p, n_max):
+    # (n, p) per-species marginals of a distribution over states, as returned by stochastic.compute_stationary_distribution
+    states = np.asarray(states);
+    marginals = np.zeros([n_max, states.shape[1]]);
+    for state_index in range(states.shape[1]):
+        marginals[:, state_index] = np.bincount(states[:, state_index], weights=p, minlength=n_max)[:n_max];
+    n = np.arange(0,n_max,1);
+    return (n, marginals)
+
+def compute_stationary_distribution_fsp(steady_state, n_max, reactant_matrix, product_matrix, reaction_rates, null_index):
+    # finite state projection counterpart of stochastic.compute_stationary_distribution over the states reachable from
+    # steady_state; returns (n, p, truncation_error)
+    states = enumerate_states(steady_state, reactant_matrix, product_matrix, reaction_rates, null_index, n_max);
+    generator, outflow = cme_generator(states, reactant_matrix, product_matrix, reaction_rates, null_index, n_max);
+    p, truncation_error = solve_stationary(generator, outflow);
+    n, marginals = marginal_distribution(states, p, n_max);
+    return (n, marginals, truncation_error)
+
+def compute_transient_distribution_fsp(tRun, start_state, n_max, reactant_matrix, product_matrix, reaction_rates, null_index):
+    # per-species distribution at time tRun of trajectories started from start_state; returns (n, p, truncation_error)
+    states = enumerate_states(start_state, reactant_matrix, product_matrix, reaction_rates, null_index, n_max);
+    generator, outflow = cme_generator(states, reactant_matrix, product_matrix, reaction_rates, null_index, n_max);
+    p0 = np.zeros(states.shape[0]);
+    p0[np.searchsorted(_state_codes(states, n_max), _state_codes(np.array([start_state], dtype=np.int64), n_max))] = 1;
+    p, truncation_error = solve_transient(generator, p0, tRun);
+    n, marginals = marginal_distribution(states, p, n_max);
+    return (n, marginals, truncation_error)
@@ -1,7 +1,8 @@
 import numpy as np
 import math
 from crnpy.legacy import tools
-from scipy.interpolate import interp1d
+from crnpy.parallel import map_chunks
+from scipy.sparse import csr_matrix, identity
 
 def crn_state_rates_generator(current_state, reactant_matrix, product_matrix, reaction_rates, null_index):
     # current_state is np.array of molecule numbers for species
@@ -32,7 +33,8 @@ def crn_state_rates_generator(current_state, reactant_matrix, product_matrix, re
     return (possible_states, propensity_arr )
 
 
-def gillespie_simulation( tRun, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, final_only=False ):
+def gillespie_simulation( tRun, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, final_only=False, rng=np.random ):
+    # rng - np.random (default), a np.random.RandomState or a np.random.Generator
     t = 0;
     current_state = start_state;
 
@@ -43,7 +45,7 @@ def gillespie_simulation( tRun, start_state, reactant_matrix, product_matrix, re
     while t < tRun:
         u, v = crn_state_rates_generator(current_state, reactant_matrix, product_matrix, reaction_rates, null_index);
         k = np.sum(v);
-        r = np.random.rand(2,1);
+        r = rng.random((2,1));
         unbiased_number_time_step = r[0];
         dt = - np.log(unbiased_number_time_step ) / k;
         unbiased_number_state_change = r[1];
@@ -66,6 +68,468 @@ def gillespie_simulation( tRun, start_state, reactant_matrix, product_matrix, re
 
     return (time_arr, state_arr)
 
+def _grow_buffer(buffer):
+    # doubles the first axis of a preallocated buffer, so appending n events costs O(n) in total
+    return np.concatenate([buffer, np.zeros_like(buffer)], axis=0)
+
+def _direct_method_events( start_state, reactant_matrix, product_matrix, reaction_rates, null_index, rng, random_chunk_size ):
+    # generator of the (time, state) of every direct-method event, drawing (time, reaction) pairs of uniform random numbers
+    # in chunks; it ends when no reaction can fire anymore
+    # The global np.random stream is drawn one pair per event, so it advances exactly as in gillespie_simulation.
+    if rng is np.random:
+        random_chunk_size = 1;
+    propensity_function = tools.stochastic_propensity_function(reactant_matrix, reaction_rates, null_index);
+    state_change = np.delete(np.asarray(product_matrix) - np.asarray(reactant_matrix), null_index, 1);
+
+    t = 0;
+    current_state = np.array(start_state);
+    random_numbers = np.zeros((0, 2));
+    next_random = 0;
+
+    while True:
+        propensities = propensity_function(current_state);
+        cumulative_propensities = np.cumsum(propensities);
+        k = cumulative_propensities[-1] if cumulative_propensities.size > 0 else 0;
+        if not k > 0:
+            return;
+
+        if next_random == random_numbers.shape[0]:
+            random_numbers = rng.random((random_chunk_size, 2));
+            next_random = 0;
+        unbiased_number_time_step, unbiased_number_state_change = random_numbers[next_random];
+        next_random = next_random + 1;
+
+        t = t - np.log(unbiased_number_time_step) / k;
+        # first reaction whose cumulative propensity exceeds the uniform draw, as in gillespie_simulation
+        l = np.searchsorted(cumulative_propensities, unbiased_number_state_change * k, side='right');
+        if l == propensities.size:
+            l = np.flatnonzero(propensities)[-1];
+        current_state = current_state + state_change[l];
+        yield (t, current_state)
+
+def gillespie_direct_simulation( tRun, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, final_only=False, rng=np.random, random_chunk_size=4096 ):
+    # same interface and output as gillespie_simulation, and the same trajectory for the same stream of random numbers,
+    # but with preallocated buffers, vectorised propensities and a searchsorted selection of the firing reaction
+    # rng - np.random (default, shares the global seed with gillespie_simulation), a np.random.RandomState or a np.random.Generator
+    # random_chunk_size - number of (time, reaction) pairs of uniform random numbers drawn at once from a RandomState or
+    #                     Generator; the global np.random is drawn one pair per event, as gillespie_simulation does
+    # The simulation stops early, at the time of the last event, when no reaction can fire anymore.
+    t = 0;
+    current_state = np.array(start_state);
+
+    time_arr = np.zeros(1024);
+    state_arr = np.zeros((1024, current_state.size), dtype=np.result_type(current_state, np.asarray(product_matrix), np.asarray(reactant_matrix)));
+    state_arr[0, :] = current_state;
+    number_of_events = 1;
+
+    if t < tRun:
+        for t, current_state in _direct_method_events(start_state, reactant_matrix, product_matrix, reaction_rates, null_index, rng, random_chunk_size):
+            if not final_only:
+                if number_of_events == time_arr.size:
+                    time_arr = _grow_buffer(time_arr);
+                    state_arr = _grow_buffer(state_arr);
+                time_arr[number_of_events] = t;
+                state_arr[number_of_events, :] = current_state;
+                number_of_events = number_of_events + 1;
+            if t >= tRun:
+                break;
+
+    if final_only:
+        return (t, np.array([current_state]))
+
+    return (time_arr[:number_of_events].copy(), state_arr[:number_of_events].copy())
+
+class OccupancyAccumulator:
+    # time-weighted histogram of the molecule number of every species, and optionally of the joint state, accumulated
+    # while a trajectory is simulated so no trajectory has to be stored
+    #   counts - (n_max, species) time spent with n molecules of each species, for n < n_max
+    #   overflow - (species, ) time spent with n_max or more molecules
+    #   joint - dict from state tuples to time spent in them, or None
+    def __init__(self, n_max, number_of_species, joint=False):
+        self.n_max = n_max;
+        self.counts = np.zeros([n_max, number_of_species]);
+        self.overflow = np.zeros(number_of_species);
+        self.total_time = 0.0;
+        self.joint = {} if joint else None;
+        self._species_index = np.arange(number_of_species);
+
+    def add(self, state, duration):
+        # adds duration of time spent in state
+        if duration <= 0:
+            return;
+        state = np.asarray(state).astype(int);
+        in_range = state < self.n_max;
+        self.counts[state[in_range], self._species_index[in_range]] += duration;
+        self.overflow[~in_range] += duration;
+        self.total_time = self.total_time + duration;
+        if self.joint is not None:
+            key = tuple(state.tolist());
+            self.joint[key] = self.joint.get(key, 0.0) + duration;
+
+    def merge(self, other):
+        # adds the occupancy of another accumulator, e.g. from an independent run, and returns self
+        if other.counts.shape != self.counts.shape:
+            raise ValueError('OccupancyAccumulator shapes do not match.');
+        self.counts = self.counts + other.counts;
+        self.overflow = self.overflow + other.overflow;
+        self.total_time = self.total_time + other.total_time;
+        if self.joint is not None and other.joint is not None:
+            for key, duration in other.joint.items():
+                self.joint[key] = self.joint.get(key, 0.0) + duration;
+        else:
+            self.joint = None;
+        return self
+
+    def distribution(self):
+        # (n, p) as returned by compute_stationary_distribution, with p the fraction of time spent at each molecule number
+        n = np.arange(0,self.n_max,1);
+        p = self.counts / self.total_time if self.total_time > 0 else np.zeros(self.counts.shape);
+        return (n, p)
+
+    def joint_distribution(self):
+        # dict from state tuples to the fraction of time spent in them
+        if self.joint is None:
+            raise ValueError('OccupancyAccumulator was created without joint=True.');
+        return {key: duration / self.total_time for key, duration in self.joint.items()}
+
+    def save(self, path):
+        joint_states = np.array(list(self.joint.keys()), dtype=int).reshape(-1, self.counts.shape[1]) if self.joint is not None else np.zeros((0, self.counts.shape[1]), dtype=int);
+        joint_times = np.array(list(self.joint.values()), dtype=float) if self.joint is not None else np.zeros(0);
+        with open(path, 'wb') as f:
+            np.savez(f, counts=self.counts, overflow=self.overflow, total_time=self.total_time, has_joint=self.joint is not None, joint_states=joint_states, joint_times=joint_times);
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            accumulator = cls(data["counts"].shape[0], data["counts"].shape[1], joint=bool(data["has_joint"]));
+            accumulator.counts = data["counts"];
+            accumulator.overflow = data["overflow"];
+            accumulator.total_time = float(data["total_time"]);
+            if accumulator.joint is not None:
+                accumulator.joint = {tuple(state.tolist()): float(duration) for state, duration in zip(data["joint_states"], data["joint_times"])};
+        return accumulator
+
+def gillespie_occupancy_simulation( tRun, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, n_max, burn_in=0, joint=False, accumulator=None, rng=np.random, random_chunk_size=4096 ):
+    # direct-method SSA that only accumulates the time spent in every state between burn_in and tRun into an
+    # OccupancyAccumulator, so memory does not grow with the number of events and the weights are exact
+    # accumulator - OccupancyAccumulator to add to, e.g. one loaded from a checkpoint; a new one is created when None
+    # returns (accumulator, final_state); a run is continued by passing both back as accumulator and start_state
+    current_state = np.array(start_state);
+    if accumulator is None:
+        accumulator = OccupancyAccumulator(n_max, current_state.size, joint=joint);
+
+    t = 0;
+    if t < tRun:
+        for event_time, new_state in _direct_method_events(start_state, reactant_matrix, product_matrix, reaction_rates, null_index, rng, random_chunk_size):
+            accumulator.add(current_state, min(event_time, tRun) - max(t, burn_in));
+            t = event_time;
+            if t >= tRun:
+                break;
+            current_state = new_state;
+        # a state in which no reaction can fire is held up to tRun
+        if t < tRun:
+            accumulator.add(current_state, tRun - max(t, burn_in));
+
+    return (accumulator, current_state)
+
+def gillespie_replica_simulation( tRun, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, number_of_replicas, rng=np.random ):
+    # runs number_of_replicas independent direct-method SSA replicas of the same network in lockstep: each wave fires one
+    # event in every replica still running, with the propensities, waiting times and reaction choices of all replicas
+    # computed as single array operations. Replicas retire once their time passes tRun, or when no reaction can fire.
+    # start_state - (species, ) start state of every replica, or (number_of_replicas, species) start states
+    # rng - np.random (default), a np.random.RandomState or a np.random.Generator
+    # returns (time_arr, state_arr), the final_only output of gillespie_simulation for every replica:
+    #   time_arr - (number_of_replicas, ) time of each replica's last event
+    #   state_arr - (number_of_replicas, species) state of each replica after its last event
+    propensity_function = tools.stochastic_propensity_function(reactant_matrix, reaction_rates, null_index);
+    state_change = np.delete(np.asarray(product_matrix) - np.asarray(reactant_matrix), null_index, 1);
+    number_of_reactions = state_change.shape[0];
+
+    start_state = np.asarray(start_state);
+    state_arr = np.array(np.broadcast_to(start_state, (number_of_replicas, state_change.shape[1])), dtype=np.result_type(start_state, state_change));
+    time_arr = np.zeros(number_of_replicas);
+    running = np.arange(number_of_replicas) if tRun > 0 and number_of_reactions > 0 else np.zeros(0, dtype=int);
+
+    while running.size > 0:
+        propensities = propensity_function(state_arr[running]);
+        cumulative_propensities = np.cumsum(propensities, axis=1);
+        k = cumulative_propensities[:, -1];
+
+        # replicas in which no reaction can fire stop at the time of their last event
+        can_fire = k > 0;
+        running, propensities, cumulative_propensities, k = running[can_fire], propensities[can_fire], cumulative_propensities[can_fire], k[can_fire];
+        if running.size == 0:
+            break;
+
+        r = rng.random((running.size, 2));
+        time_arr[running] = time_arr[running] - np.log(r[:, 0]) / k;
+        # first reaction whose cumulative propensity exceeds each replica's uniform draw, as in gillespie_simulation
+        l = np.sum(cumulative_propensities <= (r[:, 1] * k)[:, np.newaxis], axis=1);
+        last_firing = number_of_reactions - 1 - np.argmax(propensities[:, ::-1] > 0, axis=1);
+        l = np.minimum(l, last_firing);
+        state_arr[running] = state_arr[running] + state_change[l];
+
+        running = running[time_arr[running] < tRun];
+
+    return (time_arr, state_arr)
+
+class IndexedPriorityQueue:
+    # binary min-heap of the putative firing times of reactions 0..n-1, indexed by reaction, so the time of any reaction
+    # can be changed in O(log n) and the next reaction to fire is read in O(1)
+    def __init__(self, times):
+        self.times = np.array(times, dtype=float).tolist();
+        self.heap = sorted(range(len(self.times)), key=lambda reaction: self.times[reaction]);
+        self.position = [0]*len(self.heap);
+        for index, reaction in enumerate(self.heap):
+            self.position[reaction] = index;
+
+    def top(self):
+        # (reaction, time) of the earliest putative firing
+        reaction = self.heap[0];
+        return (reaction, self.times[reaction])
+
+    def update(self, reaction, time):
+        old_time = self.times[reaction];
+        self.times[reaction] = time;
+        if time < old_time:
+            self._sift_up(self.position[reaction]);
+        elif time > old_time:
+            self._sift_down(self.position[reaction]);
+
+    def _swap(self, i, j):
+        heap = self.heap;
+        heap[i], heap[j] = heap[j], heap[i];
+        self.position[heap[i]] = i;
+        self.position[heap[j]] = j;
+
+    def _sift_up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2;
+            if self.times[self.heap[i]] >= self.times[self.heap[parent]]:
+                break;
+            self._swap(i, parent);
+            i = parent;
+
+    def _sift_down(self, i):
+        size = len(self.heap);
+        while True:
+            smallest = i;
+            for child in (2*i + 1, 2*i + 2):
+                if child < size and self.times[self.heap[child]] < self.times[self.heap[smallest]]:
+                    smallest = child;
+            if smallest == i:
+                break;
+            self._swap(i, smallest);
+            i = smallest;
+
+def reaction_dependency_graph( reactant_matrix, product_matrix, null_index ):
+    # list whose entry i holds the reactions whose propensity can change when reaction i fires, i.e. reaction i itself
+    # and every reaction consuming a species whose molecule number reaction i changes
+    # built as a sparse product, so the cost follows the number of dependencies rather than reactions**2
+    consumes = csr_matrix(np.delete(np.asarray(reactant_matrix), null_index, 1) > 0, dtype=np.int64);
+    changes = csr_matrix(np.delete(np.asarray(product_matrix) - np.asarray(reactant_matrix), null_index, 1) != 0, dtype=np.int64);
+    depends = (changes @ consumes.T + identity(changes.shape[0], dtype=np.int64, format='csr')).tocsr();
+    depends.sort_indices();
+    return [depends.indices[depends.indptr[i]:depends.indptr[i+1]].tolist() for i in range(depends.shape[0])]
+
+def next_reaction_simulation( tRun, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, final_only=False, rng=np.random, random_chunk_size=4096 ):
+    # Gibson-Bruck next reaction method with the same interface and output as gillespie_simulation.
+    # Putative firing times are kept in an IndexedPriorityQueue and, after each event, only the reactions in the
+    # reaction_dependency_graph of the fired reaction are updated, so an event costs O(dependencies * log(reactions))
+    # rather than O(reactions). The simulation stops early, at the time of the last event, when no reaction can fire.
+    # rng - np.random (default), a np.random.RandomState or a np.random.Generator
+    reactant_exponents = np.delete(np.asarray(reactant_matrix), null_index, 1).astype(int);
+    state_change = np.delete(np.asarray(product_matrix) - np.asarray(reactant_matrix), null_index, 1);
+    rates = np.asarray(reaction_rates, dtype=float).ravel().tolist();
+    number_of_reactions = len(rates);
+
+    # per reaction (species, exponent) reactant pairs and (species, change) updates, as plain lists for scalar work
+    reactants = [[(s, int(reactant_exponents[i, s])) for s in np.flatnonzero(reactant_exponents[i])] for i in range(number_of_reactions)];
+    changes = [[(s, state_change[i, s]) for s in np.flatnonzero(state_change[i])] for i in range(number_of_reactions)];
+    dependencies = reaction_dependency_graph(reactant_matrix, product_matrix, null_index);
+
+    t = 0;
+    current_state = np.array(start_state);
+    counts = current_state.tolist();
+
+    def propensity(i):
+        result = rates[i];
+        for s, ex in reactants[i]:
+            for offset in range(ex):
+                result = result * (counts[s] - offset);
+        return max(result, 0.0);
+
+    # the global np.random stream is drawn one number at a time, so it only advances by the numbers actually used
+    if rng is np.random:
+        random_chunk_size = 1;
+    random_numbers = [];
+    def exponential():
+        # unit exponential random numbers, drawn in chunks
+        if not random_numbers:
+            random_numbers.extend((-np.log(rng.random(random_chunk_size))).tolist());
+        return random_numbers.pop();
+
+    propensities = [propensity(i) for i in range(number_of_reactions)];
+    queue = IndexedPriorityQueue([exponential()/a if a > 0 else np.inf for a in propensities]);
+
+    time_arr = np.zeros(1024);
+    state_arr = np.zeros((1024, current_state.size), dtype=np.result_type(current_state, state_change));
+    state_arr[0, :] = current_state;
+    number_of_events = 1;
+
+    while t < tRun and number_of_reactions > 0:
+        mu, tau = queue.top();
+        if tau == np.inf:
+            break;
+        t = tau;
+        for s, change in changes[mu]:
+            counts[s] = counts[s] + change;
+
+        for j in dependencies[mu]:
+            old_propensity = propensities[j];
+            new_propensity = propensity(j);
+            propensities[j] = new_propensity;
+            if new_propensity == 0:
+                new_time = np.inf;
+            elif j == mu or old_propensity == 0:
+                new_time = t + exponential()/new_propensity;
+            else:
+                # rescales the remaining waiting time of the unfired reaction rather than drawing a new one
+                new_time = t + (old_propensity/new_propensity)*(queue.times[j] - t);
+            queue.update(j, new_time);
+
+        if not final_only:
+            if number_of_events == time_arr.size:
+                time_arr = _grow_buffer(time_arr);
+                state_arr = _grow_buffer(state_arr);
+            time_arr[number_of_events] = t;
+            state_arr[number_of_events, :] = counts;
+            number_of_events = number_of_events + 1;
+
+    current_state = np.array(counts, dtype=state_arr.dtype);
+    if final_only:
+        return (t, np.array([current_state]))
+
+    return (time_arr[:number_of_events].copy(), state_arr[:number_of_events].copy())
+
+def _tau_leaping_g( reactant_exponents ):
+    # Cao-Gillespie-Petzold g_i factor of every species as a function of its molecule number x. For species i, hor is the
+    # highest order of the reactions consuming it and needed the largest number of molecules of i one of them consumes:
+    #   g_i = hor/needed * (needed + sum_{k=1}^{needed-1} k/(x_i - k))
+    # which gives the published cases, e.g. 2 + 1/(x-1) for 2A -> ..., and 3/2*(2 + 1/(x-1)) for 2A + B -> ...
+    orders = reactant_exponents.sum(1);
+    number_of_species = reactant_exponents.shape[1];
+    hor = np.zeros(number_of_species);
+    needed = np.ones(number_of_species, dtype=int);
+    for species_index in range(number_of_species):
+        consuming = np.flatnonzero(reactant_exponents[:, species_index] > 0);
+        if consuming.size == 0:
+            continue;
+        hor[species_index] = np.max(orders[consuming]);
+        highest_order = consuming[orders[consuming] == hor[species_index]];
+        needed[species_index] = np.max(reactant_exponents[highest_order, species_index]);
+
+    def g(x):
+        result = needed.astype(float);
+        for k in range(1, np.max(needed, initial=1)):
+            result = result + np.where(needed > k, k/np.maximum(x - k, 1), 0);
+        return hor/needed*result;
+
+    return g
+
+def tau_leaping_simulation( tRun, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, timeStep, epsilon=0.03, critical_threshold=10, ssa_threshold=10, number_of_ssa_steps=100, rng=np.random ):
+    # approximate SSA by adaptive tau-leaping (Cao, Gillespie & Petzold, J. Chem. Phys. 124, 044109 (2006))
+    # returns (time_arr, state_arr) on the fixed grid np.arange(0, tRun, timeStep), as resample_to_fixed_step does for an
+    # exact trajectory, with the state at each grid time. Leaps never step over a grid point.
+    # epsilon - bound on the relative change of the propensities during a leap
+    # critical_threshold - reactions that can fire fewer than this many times before exhausting a reactant are critical
+    #                      and fire at most once per leap
+    # ssa_threshold, number_of_ssa_steps - when the leap would be shorter than ssa_threshold/a0, number_of_ssa_steps exact
+    #                      SSA steps are taken instead, which is what happens near zero molecule numbers
+    # rng - np.random (default), a np.random.RandomState or a np.random.Generator
+    propensity_function = tools.stochastic_propensity_function(reactant_matrix, reaction_rates, null_index);
+    reactant_exponents = np.delete(np.asarray(reactant_matrix), null_index, 1).astype(int);
+    state_change = np.delete(np.asarray(product_matrix) - np.asarray(reactant_matrix), null_index, 1);
+    g = _tau_leaping_g(reactant_exponents);
+    is_reactant_species = np.any(reactant_exponents > 0, 0);
+    consumed = state_change < 0;
+
+    time_arr = np.arange(0, tRun, timeStep);
+    current_state = np.array(start_state);
+    state_arr = np.zeros((time_arr.size, current_state.size), dtype=np.result_type(current_state, state_change));
+    if time_arr.size == 0:
+        return (time_arr, state_arr)
+    state_arr[0, :] = current_state;
+
+    t = 0;
+    next_grid_index = 1;
+    ssa_steps_left = 0;
+
+    while next_grid_index < time_arr.size:
+        next_grid_time = time_arr[next_grid_index];
+        propensities = propensity_function(current_state);
+        a0 = np.sum(propensities);
+
+        if not a0 > 0:
+            # no reaction can fire anymore, the state is constant up to the end of the grid
+            state_arr[next_grid_index:, :] = current_state;
+            break;
+
+        tau = next_grid_time - t;
+        if ssa_steps_left == 0:
+            # number of times each reaction can fire before exhausting one of its reactants
+            max_firings = np.min(np.where(consumed, current_state // np.where(consumed, -state_change, 1), np.inf), 1);
+            critical = np.logical_and(propensities > 0, max_firings < critical_threshold);
+            noncritical = np.logical_and(propensities > 0, ~critical);
+
+            tau_noncritical = np.inf;
+            if np.any(noncritical):
+                mu = state_change[noncritical].T @ propensities[noncritical];
+                sigma2 = (state_change[noncritical]**2).T @ propensities[noncritical];
+                # species that no reaction consumes have g = 0, and are left out of the minimum below
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    bound = np.maximum(epsilon*current_state/g(current_state), 1);
+                    tau_noncritical = np.min(np.where(is_reactant_species, np.minimum(bound/np.abs(mu), bound**2/sigma2), np.inf), initial=np.inf);
+
+            if tau_noncritical < ssa_threshold/a0:
+                ssa_steps_left = number_of_ssa_steps;
+
+        if ssa_steps_left > 0:
+            # exact direct-method step; by memorylessness a waiting time past the next grid point just advances to it
+            ssa_steps_left = ssa_steps_left - 1;
+            dt = -np.log(rng.random())/a0;
+            if t + dt < next_grid_time:
+                l = min(np.searchsorted(np.cumsum(propensities), rng.random()*a0, side='right'), propensities.size - 1);
+                current_state = current_state + state_change[l];
+                t = t + dt;
+                continue;
+        else:
+            a0_critical = np.sum(propensities[critical]);
+            tau_critical = -np.log(rng.random())/a0_critical if a0_critical > 0 else np.inf;
+            while True:
+                tau = min(tau_noncritical, tau_critical, next_grid_time - t);
+                firings = np.zeros(propensities.size, dtype=int);
+                firings[noncritical] = rng.poisson(propensities[noncritical]*tau);
+                if tau == tau_critical:
+                    critical_propensities = np.where(critical, propensities, 0);
+                    l = min(np.searchsorted(np.cumsum(critical_propensities), rng.random()*a0_critical, side='right'), propensities.size - 1);
+                    firings[l] = firings[l] + 1;
+                new_state = current_state + firings @ state_change;
+                if np.all(new_state >= 0):
+                    break;
+                # a leap that drives a molecule number negative is rejected and retried with half the step
+                tau_noncritical = tau/2;
+            current_state = new_state;
+            if t + tau < next_grid_time:
+                t = t + tau;
+                continue;
+
+        t = next_grid_time;
+        state_arr[next_grid_index, :] = current_state;
+        next_grid_index = next_grid_index + 1;
+
+    return (time_arr, state_arr)
+
 def find_smallest_time_between_events(list_of_trajectories):
 
     def deltas(x_tuple):
@@ -74,10 +538,11 @@ def find_smallest_time_between_events(list_of_trajectories):
 
     return result
 
-def compute_stationary_distribution(steady_state, n_max, number_of_trajectories, reactant_matrix, product_matrix, reaction_rates, null_index):
+def compute_stationary_distribution(steady_state, n_max, number_of_trajectories, reactant_matrix, product_matrix, reaction_rates, null_index, simulation=gillespie_simulation):
+    # simulation - SSA engine with the interface of gillespie_simulation, e.g. gillespie_direct_simulation or next_reaction_simulation
     p = np.zeros([n_max, steady_state.shape[0] ]);
     for i in range(0, number_of_trajectories):
-        time, trajectory = gillespie_simulation( i, steady_state, reactant_matrix, product_matrix, reaction_rates, null_index , final_only=True);
+        time, trajectory = simulation( i, steady_state, reactant_matrix, product_matrix, reaction_rates, null_index , final_only=True);
         for state_index in range(steady_state.shape[0]):
             final_value = trajectory[state_index]
             if final_value >= 0 and final_value < n_max:
@@ -87,6 +552,37 @@ def compute_stationary_distribution(steady_state, n_max, number_of_trajectories,
     n = np.arange(0,n_max,1);
     return (n,p)
 
+def _stationary_histogram_block( seed_sequence, number_of_trajectories, tRun, steady_state, n_max, reactant_matrix, product_matrix, reaction_rates, null_index, simulation ):
+    # (n_max, species) counts of the final states of one block of trajectories, simulated from the block's own stream
+    rng = np.random.default_rng(seed_sequence);
+    counts = np.zeros([n_max, steady_state.shape[0]]);
+    for i in range(number_of_trajectories):
+        time, trajectory = simulation( tRun, steady_state, reactant_matrix, product_matrix, reaction_rates, null_index, final_only=True, rng=rng );
+        final_state = np.asarray(trajectory[0]).astype(int);
+        in_range = np.logical_and(final_state >= 0, final_state < n_max);
+        counts[final_state[in_range], np.flatnonzero(in_range)] += 1;
+    return counts
+
+def compute_stationary_distribution_ensemble(steady_state, n_max, number_of_trajectories, tRun, reactant_matrix, product_matrix, reaction_rates, null_index, seed=None, processes=None, block_size=64, simulation=gillespie_direct_simulation):
+    # compute_stationary_distribution with every trajectory run up to tRun, spread over a pool of worker processes
+    # Trajectories are simulated in blocks of block_size, each from its own np.random.SeedSequence-spawned generator,
+    # and every block only returns its histogram of final states, so a given seed gives the same (n, p) whatever the
+    # number of processes.
+    # seed - int or np.random.SeedSequence
+    # processes - number of worker processes, None uses every core and 1 runs in this process
+    # simulation - SSA engine with the interface of gillespie_simulation and an rng argument
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed);
+    block_starts = list(range(0, number_of_trajectories, block_size));
+    block_seeds = seed_sequence.spawn(len(block_starts));
+    chunk_args = [(block_seed, min(block_size, number_of_trajectories - start), tRun, steady_state, n_max, reactant_matrix, product_matrix, reaction_rates, null_index, simulation) for block_seed, start in zip(block_seeds, block_starts)];
+
+    p = np.zeros([n_max, steady_state.shape[0] ]);
+    for counts in map_chunks(_stationary_histogram_block, chunk_args, processes):
+        p = p + counts;
+    p = p/number_of_trajectories;
+    n = np.arange(0,n_max,1);
+    return (n,p)
+
 def compute_stationary_distribution_single_traj(steady_state, n_max, tFinal, timeStep, reactant_matrix, product_matrix, reaction_rates, null_index):
     p = np.zeros([n_max, steady_state.shape[0] ]);
     time, trajectory = gillespie_simulation( tFinal, steady_state, reactant_matrix, product_matrix, reaction_rates, null_index );
@@ -110,50 +606,74 @@ def find_smallest_final_event_time(list_of_trajectories):
 
     return result
 
+def previous_event_index( old_time_axis, resampled_time_axis ):
+    # index of the last event at or before every resampled time, i.e. interp1d(kind='previous') in one searchsorted
+    old_time_axis = np.asarray(old_time_axis);
+    resampled_time_axis = np.asarray(resampled_time_axis);
+    if resampled_time_axis.size > 0 and (np.min(resampled_time_axis) < old_time_axis[0] or np.max(resampled_time_axis) > old_time_axis[-1]):
+        raise ValueError('resampled_time_axis is outside of the range of old_time_axis.')
+    return np.searchsorted(old_time_axis, resampled_time_axis, side='right') - 1
+
 def interpolate_onto_same_dt( resampled_time_axis, old_time_axis, state_space):
-    f = interp1d(old_time_axis, state_space, kind='previous')
-    return f(resampled_time_axis)
+    state_space = np.asarray(state_space);
+    return state_space[previous_event_index(old_time_axis, resampled_time_axis)].astype(float)
 
 def interpolate_all_states(x_tuple, resampled_time_axis):
     old_time = x_tuple[0];
-    state_trajectory = x_tuple[1];
-
-    number_of_states = state_trajectory.shape[1];
-
-    state_arr = [];
-    for state_index in range(number_of_states):
-        specific_trajectory = state_trajectory[:,state_index]
-        new_specific_trajectory = interpolate_onto_same_dt( resampled_time_axis, old_time, specific_trajectory )
-        state_arr.append(new_specific_trajectory);
-    return state_arr
+    state_trajectory = np.asarray(x_tuple[1]);
+
+    resampled_states = state_trajectory[previous_event_index(old_time, resampled_time_axis)].astype(float);
+    return [resampled_states[:, state_index] for state_index in range(state_trajectory.shape[1])]
+
+def resample_all_trajectories(list_of_trajectories, resampled_time_axis, out=None, strictly_before=False):
+    # resamples a list of (time, trajectory) event trajectories onto one time axis, with the state of each trajectory at
+    # every resampled time (interp1d(kind='previous') semantics). Resampled times after a trajectory's last event keep
+    # its last state; resampled times before a trajectory's first event raise a ValueError.
+    # out - optional preallocated (trajectories, time, species) array to write into
+    # strictly_before - use the state of the last event strictly before each resampled time instead, as
+    #                   resample_to_fixed_step does; a resampled time equal to the first event time then gets the first state
+    # returns the (trajectories, time, species) array of resampled states
+    resampled_time_axis = np.asarray(resampled_time_axis);
+    if out is None:
+        number_of_states = np.asarray(list_of_trajectories[0][1]).shape[1] if len(list_of_trajectories) > 0 else 0;
+        out = np.zeros([len(list_of_trajectories), resampled_time_axis.size, number_of_states]);
+
+    side = 'left' if strictly_before else 'right';
+    for trajectory_index, (time_in, traj) in enumerate(list_of_trajectories):
+        if resampled_time_axis.size > 0 and np.min(resampled_time_axis) < time_in[0]:
+            raise ValueError('resampled_time_axis starts before the first event of trajectory ' + str(trajectory_index) + '.');
+        last_event_time_index = np.searchsorted(time_in, resampled_time_axis, side=side) - 1;
+        # only reached at the first event time with strictly_before, where no event lies strictly before
+        last_event_time_index = np.maximum(last_event_time_index, 0);
+        out[trajectory_index] = np.asarray(traj)[last_event_time_index];
+    return out
+
+def _fixed_step_time_axis(number_of_points, timeStep):
+    # 0, timeStep, 2*timeStep, ... accumulated by repeated addition, as in a loop of time = time + timeStep
+    time_arr = np.zeros(number_of_points);
+    time_arr[1:] = np.cumsum(np.full(max(number_of_points - 1, 0), float(timeStep)));
+    return time_arr
 
 def interpolate_all_trajectories(list_of_trajectories, timeStep):
 
     min_time = find_smallest_final_event_time(list_of_trajectories);
     resampled_time_axis = np.arange(start=0, stop=min_time, step=timeStep);
 
-    resampled_trajectories = []
+    # every trajectory is resampled as by resample_to_fixed_step, up to its own final event, in one pass over a shared
+    # axis as long as the longest of them
+    number_of_points = [math.ceil(time_in[-1]/timeStep) for time_in, traj in list_of_trajectories];
+    time_arr = _fixed_step_time_axis(max(number_of_points, default=0), timeStep);
+    state_arr = resample_all_trajectories(list_of_trajectories, time_arr, strictly_before=True);
 
-    for trajectory_index in range(len(list_of_trajectories)):
-        resampled_trajectories.append( resample_to_fixed_step(list_of_trajectories[trajectory_index][0], list_of_trajectories[trajectory_index][1], timeStep) )
+    resampled_trajectories = [(time_arr[:iFinal].copy(), state_arr[trajectory_index, :iFinal]) for trajectory_index, iFinal in enumerate(number_of_points)];
 
     return resampled_time_axis, resampled_trajectories
 
 def resample_to_fixed_step(time_in, traj, timeStep ):
-    num_of_states = traj.shape[1];
-    time = 0;
+    # state of the last event strictly before each time 0, timeStep, 2*timeStep, ... (the first point is traj[0]),
+    # found for all times with one searchsorted
     tFinal = time_in[-1]
     iFinal = math.ceil(tFinal/timeStep);
-    time_arr = np.zeros(iFinal);
-    state_arr = np.zeros([iFinal,num_of_states]);
-
-    time_arr[0] = time;
-    state_arr[0, :] = traj[0,:];
-
-    for i in range(1,iFinal,1):
-        time = time + timeStep
-        time_arr[i] = time
-        last_event_time_index = np.max(np.argwhere(time_in < time));
-        for state in range(0,num_of_states,1):
-            state_arr[i, state] = traj[last_event_time_index, state]
-    return (time_arr, state_arr)
\ No newline at end of file
+    time_arr = _fixed_step_time_axis(iFinal, timeStep);
+    state_arr = resample_all_trajectories([(time_in, traj)], time_arr, strictly_before=True)[0];
+    return (time_arr, state_arr)
@@ -72,4 +72,33 @@ def compute_stoichiometry_terms_stochastic_propensity( exponents, species_vector
             ran = np.arange(val-ex+1, val+1 , 1);
             res = np.prod(ran);
             result = result*res;
-    return result;
\ No newline at end of file
+    return result;
+
+def stochastic_propensity_function( reactant_matrix, reaction_rates, null_index):
+    # vectorised version of reaction_rates[i]*compute_stoichiometry_terms_stochastic_propensity(reactant_matrix[i,:], state, null_index)
+    # for every reaction i at once. Returns a function of the state (molecule numbers without the null species) that gives
+    # the propensity of every reaction. A (..., species) array of states gives a (..., reactions) array of propensities.
+    # Each falling factorial x*(x-1)*...*(x-a+1) is stored as a list of (species, offset) factors, grouped by reaction,
+    # so evaluating the propensities costs one fancy index and one np.multiply.reduceat.
+    reactant_exponents = np.delete(np.asarray(reactant_matrix), null_index, 1).astype(int);
+    rates = np.asarray(reaction_rates, dtype=float).ravel();
+
+    reaction_idx, species_idx = np.nonzero(reactant_exponents);
+    exponents = reactant_exponents[reaction_idx, species_idx];
+    factor_reaction = np.repeat(reaction_idx, exponents);
+    factor_species = np.repeat(species_idx, exponents);
+    # offsets 0, 1, ..., a-1 within every (reaction, species) pair
+    factor_offset = np.arange(factor_species.size) - np.repeat(np.cumsum(exponents) - exponents, exponents);
+
+    segment_reactions, segment_starts = np.unique(factor_reaction, return_index=True);
+
+    def propensities(state):
+        state = np.asarray(state, dtype=float);
+        result = np.broadcast_to(rates, state.shape[:-1] + rates.shape).copy();
+        if segment_reactions.size > 0:
+            # a factor is zero, rather than negative, whenever a species has fewer molecules than the reaction consumes
+            factors = state[..., factor_species] - factor_offset;
+            result[..., segment_reactions] *= np.multiply.reduceat(factors, segment_starts, axis=-1);
+        return result;
+
+    return propensities
@@ -0,0 +1,10 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence, Optional
+
+def map_chunks(fn, chunk_args: Sequence[tuple], processes: Optional[int]):
+    # applies fn to every tuple of arguments, in this process when processes == 1 and otherwise across a process pool
+    # processes - number of worker processes, None uses every core
+    if processes == 1:
+        return [fn(*args) for args in chunk_args]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(fn, *zip(*chunk_args)))
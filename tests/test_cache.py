@@ -0,0 +1,107 @@
+import crnpy
+import numpy as np
+import pytest
+from crnpy.crn.cache import TrajectoryCache
+
+@pytest.fixture
+def crn_obj():
+    return crnpy.create_crn(from_arrays={
+        "species": np.array(['X_1', 'X_2', 'Y_1']),
+        "reaction_rates": np.array([5.7, 10.3]),
+        "reaction_stoichiometry": np.array([[1,0,1], [0,1,1]]),
+        "product_stoichiometry": np.array([[0,0,2], [0,0,1]]),
+        "initial_concentrations": np.array([9.0, 10.6, 11.0])
+    })
+
+@pytest.fixture
+def crn_obj_same(crn_obj):
+    return crnpy.create_crn(from_dict=crn_obj.to_dict())
+
+def test_cache_hit_and_miss(crn_obj, crn_obj_same):
+    cache = TrajectoryCache()
+    sol = crn_obj.integrate(0.01, 0.0025, cache=cache)
+    assert cache.stats["misses"] == 1
+
+    cached = crn_obj_same.integrate(0.01, 0.0025, cache=cache)
+    assert cache.stats["hits"] == 1
+    np.testing.assert_array_equal(cached.y, sol.y)
+    np.testing.assert_array_equal(cached.t, sol.t)
+    assert cached.status == sol.status
+
+    crn_obj.integrate(0.02, 0.0025, cache=cache)
+    crn_obj.integrate(0.01, 0.0025, method='BDF', cache=cache)
+    assert cache.stats["misses"] == 3
+
+def test_cache_keys_depend_on_content(crn_obj):
+    cache = TrajectoryCache()
+    key = cache.key(crn_obj, 0.01, 0.0025)
+    other = crnpy.create_crn(from_arrays={
+        "species": crn_obj.species,
+        "reaction_rates": np.array([5.7, 10.4]),
+        "reaction_stoichiometry": crn_obj.reaction_stoichiometry,
+        "product_stoichiometry": crn_obj.product_stoichiometry,
+        "initial_concentrations": crn_obj.initial_concentrations
+    })
+    assert key == cache.key(crn_obj, 0.01, 0.0025)
+    assert key != cache.key(other, 0.01, 0.0025)
+
+def test_cache_lru_byte_budget(crn_obj):
+    # each trajectory is 4 time points + 3x4 states of float64
+    entry_bytes = 16*8
+    cache = TrajectoryCache(max_bytes=2*entry_bytes)
+    for t_length in [0.01, 0.0099, 0.0098]:
+        crn_obj.integrate(t_length, 0.0025, cache=cache)
+
+    assert cache.stats["entries"] == 2
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["bytes"] <= 2*entry_bytes
+
+    crn_obj.integrate(0.01, 0.0025, cache=cache)
+    assert cache.stats["hits"] == 0
+    crn_obj.integrate(0.0098, 0.0025, cache=cache)
+    assert cache.stats["hits"] == 1
+
+def test_cache_disk_tier(crn_obj, tmp_path):
+    cache = TrajectoryCache(directory=str(tmp_path))
+    sol = crn_obj.integrate(0.01, 0.0025, cache=cache)
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+
+    new_cache = TrajectoryCache(directory=str(tmp_path))
+    cached = crn_obj.integrate(0.01, 0.0025, cache=new_cache)
+    assert new_cache.stats["disk_hits"] == 1
+    assert new_cache.stats["misses"] == 0
+    np.testing.assert_array_equal(cached.y, sol.y)
+
+    new_cache.clear(disk=True)
+    assert len(list(tmp_path.glob('*.npz'))) == 0
+
+def _assert_same_solution(cached, sol):
+    for name in ("t", "y"):
+        np.testing.assert_array_equal(cached[name], sol[name])
+    for name in ("t_events", "y_events"):
+        assert len(cached[name]) == len(sol[name])
+        for cached_events, events in zip(cached[name], sol[name]):
+            np.testing.assert_array_equal(cached_events, events)
+    for name in ("status", "message", "success", "nfev", "njev", "nlu"):
+        assert cached[name] == sol[name]
+
+@pytest.mark.parametrize("disk", [False, True])
+def test_cached_solution_matches_solve_ivp_result(crn_obj, tmp_path, disk):
+    cache = TrajectoryCache(directory=str(tmp_path) if disk else None)
+    sol = crn_obj.integrate(0.01, 0.0025, cache=cache)
+    if disk:
+        cache = TrajectoryCache(directory=str(tmp_path))
+    cached = crn_obj.integrate(0.01, 0.0025, cache=cache)
+    _assert_same_solution(cached, sol)
+
+    # hits are writable copies, so editing one does not change the cached entry
+    cached.y[0, 0] = -1.0
+    cached.t_events[0] = None
+    again = crn_obj.integrate(0.01, 0.0025, cache=cache)
+    _assert_same_solution(again, sol)
+
+def test_distance_from_cache(crn_obj, crn_obj_same):
+    cache = TrajectoryCache()
+    crn_obj.distance_from(crn_obj_same, np.asarray(['X_1']), 0.01, 0.0025, cache=cache)
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 1
@@ -2,7 +2,7 @@ import crnpy
 import numpy as np
 import pytest
 from pathlib import Path
-from crnpy.crn.token import create_vocab, parse_tuples_into_matrix
+from crnpy.crn.token import create_vocab, create_implicit_vocab, parse_tuples_into_matrix
 print(crnpy.__file__)
 
 @pytest.fixture
@@ -123,9 +123,9 @@ def crn_blowup():
     crn = crnpy.create_crn(from_arrays=_from_arrays)
     return crn
 
-def test_crn_repr(crn_obj, crn_text):
+def test_crn_repr(crn_obj):
     rep = repr(crn_obj)
-    assert crn_text == rep
+    assert rep == "CRN(number_of_species=3, number_of_reactions=2)"
 
 def test_crn_str(crn_obj, crn_text):
     s = str(crn_obj)
@@ -216,3 +216,152 @@ def test_reduce(crn_verbose):
     print(crn_verbose)
     assert crn_verbose.number_of_reactions == 1
     assert crn_verbose.stoichiometry_matrix.shape == (1, 1)
+
+def test_integrate_stiff_method(crn_obj):
+    _t_length = 0.01
+    _t_step = 0.0025
+
+    sol_crn = crn_obj.integrate(_t_length, _t_step, method='BDF')
+
+    assert sol_crn.y.shape == (3, 4)
+    np.testing.assert_allclose(sol_crn.y, np.array([[9.,  7.618279,  6.326681,  5.162753], [10.6,  7.843389,  5.606759,  3.882952], [11., 12.381721, 13.673319, 14.837247]]), rtol=1e-4)
+
+def test_integrate_blowup_stiff_method(crn_blowup):
+    sol_crn = crn_blowup.integrate(2, 0.0025, method='Radau')
+    assert sol_crn.status == 1
+    assert sol_crn.y.shape[1] < 800
+
+def test_mass_action_rhs_rebuilt_after_reduce(crn_verbose):
+    rhs = crn_verbose.mass_action_rhs
+    assert rhs is crn_verbose.mass_action_rhs
+    assert rhs.number_of_species == 3
+    crn_verbose.reduce()
+    assert crn_verbose.mass_action_rhs.number_of_species == 1
+
+def test_sweep_reaction_rates(crn_obj):
+    _t_length = 0.01
+    _t_step = 0.0025
+    rates = np.array([[5.7, 10.3], [1.0, 2.0], [0.0, 0.0]])
+
+    t, y, blowup = crn_obj.sweep(_t_length, _t_step, reaction_rates=rates, processes=1, chunksize=2)
+
+    assert y.shape == (3, 3, 4)
+    assert not blowup.any()
+    np.testing.assert_array_equal(t, np.array([0, 0.0025, 0.005, 0.0075]))
+    np.testing.assert_allclose(y[0], crn_obj.integrate(_t_length, _t_step).y, rtol=1e-6)
+    np.testing.assert_allclose(y[2], np.repeat(crn_obj.initial_concentrations[:, np.newaxis], 4, axis=1))
+
+    single = crnpy.create_crn(from_arrays={"species": crn_obj.species, "reaction_rates": rates[1], "reaction_stoichiometry": crn_obj.reaction_stoichiometry, "product_stoichiometry": crn_obj.product_stoichiometry, "initial_concentrations": crn_obj.initial_concentrations})
+    np.testing.assert_allclose(y[1], single.integrate(_t_length, _t_step).y, rtol=1e-6)
+
+def test_sweep_initial_concentrations_process_pool(crn_obj, crn_blowup):
+    _t_length = 0.01
+    _t_step = 0.0025
+    inits = np.array([[9.0, 10.6, 11.0], [1.0, 1.0, 1.0]])
+
+    t, y, blowup = crn_obj.sweep(_t_length, _t_step, initial_concentrations=inits, processes=2, chunksize=1)
+    np.testing.assert_allclose(y[0], crn_obj.integrate(_t_length, _t_step).y, rtol=1e-6)
+    np.testing.assert_allclose(y[1, :, 0], inits[1])
+
+    t, y, blowup = crn_blowup.sweep(2, 0.0025, initial_concentrations=np.array([[9.9e5], [1.0]]), processes=1)
+    np.testing.assert_array_equal(blowup, np.array([True, False]))
+    assert np.isnan(y[0, 0, -1])
+
+def test_sweep_mismatched_points(crn_obj):
+    with pytest.raises(ValueError):
+        crn_obj.sweep(0.01, 0.0025, reaction_rates=np.ones((2, 2)), initial_concentrations=np.ones((3, 3)), processes=1)
+    with pytest.raises(ValueError):
+        crn_obj.sweep(0.01, 0.0025, reaction_rates=np.ones((2, 3)), processes=1)
+
+def test_fingerprint_is_deterministic(crn_obj, crn_obj_same):
+    assert crn_obj.fingerprint == crn_obj_same.fingerprint
+    crn = crnpy.create_crn(from_arrays={
+        "species": np.array(['X_1', 'X_2', 'Y_1']),
+        "reaction_rates": np.array([5.7, 10.3], dtype=np.float64),
+        "reaction_stoichiometry": np.array([[1,0,1], [0,1,1]], dtype=np.int64),
+        "product_stoichiometry": np.array([[0,0,2], [0,0,1]], dtype=np.int64),
+        "initial_concentrations": np.array([9.0, 10.6, 11.0], dtype=np.float64)
+    })
+    # independent of the process hash seed, so it can be used as an on-disk key
+    assert crn.fingerprint == '77a1925c2a786873d75aa309f517cc67'
+
+def test_fingerprint_depends_on_dtype_and_shape(crn_obj):
+    other = crnpy.create_crn(from_dict=crn_obj.to_dict())
+    other.reaction_rates = other.reaction_rates.astype(np.float32)
+    assert other.fingerprint != crn_obj.fingerprint
+
+    other.reaction_rates = crn_obj.reaction_rates
+    other.reaction_stoichiometry = crn_obj.reaction_stoichiometry.reshape(3, 2)
+    assert other.fingerprint != crn_obj.fingerprint
+
+def test_fingerprint_invalidated_by_reduce(crn_verbose):
+    before = crn_verbose.fingerprint
+    crn_verbose.reduce()
+    after = crn_verbose.fingerprint
+    assert before != after
+    assert after == crnpy.create_crn(from_dict=crn_verbose.to_dict()).fingerprint
+    assert hash(crn_verbose) == crn_verbose.crn_id
+
+def test_defining_arrays_are_read_only_copies(crn_obj):
+    from crnpy.crn.cache import TrajectoryCache
+    cache = TrajectoryCache()
+    before = crn_obj.fingerprint
+    sol_before = crn_obj.integrate(0.01, 0.0025, cache=cache)
+
+    with pytest.raises(ValueError):
+        crn_obj.reaction_rates[0] *= 50
+    with pytest.raises(ValueError):
+        crn_obj.initial_concentrations[0] += 3
+
+    # the arrays passed in are copied, so editing them does not change the CRN either
+    rates = np.array([5.7, 10.3])
+    crn = crnpy.create_crn(from_arrays={"species": crn_obj.species, "reaction_rates": rates, "reaction_stoichiometry": crn_obj.reaction_stoichiometry, "product_stoichiometry": crn_obj.product_stoichiometry, "initial_concentrations": crn_obj.initial_concentrations})
+    rates[0] = 100.0
+    assert crn.reaction_rates[0] == 5.7
+
+    reaction_rates = crn_obj.reaction_rates.copy()
+    reaction_rates[0] *= 50
+    crn_obj.reaction_rates = reaction_rates
+    assert crn_obj.fingerprint != before
+    sol_after = crn_obj.integrate(0.01, 0.0025, cache=cache)
+    assert cache.stats["misses"] == 2
+    assert not np.allclose(sol_after.y, sol_before.y)
+
+def test_reduce_sums_duplicates_in_order():
+    species = np.array(['A', 'B', 'C', 'D'])
+    reaction_rates = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 0.5])
+    react_stoch = np.array([[0, 1, 0, 0], [1, 0, 0, 0], [0, 1, 0, 0], [1, 0, 0, 0], [0, 0, 1, 0], [1, 0, 0, 0]])
+    prod_stoch = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0]])
+    crn = crnpy.create_crn(from_arrays={"species": species, "reaction_rates": reaction_rates, "reaction_stoichiometry": react_stoch, "product_stoichiometry": prod_stoch})
+    crn.reduce()
+
+    np.testing.assert_array_equal(crn.reaction_rates, np.array([4.0, 6.0, 0.5]))
+    np.testing.assert_array_equal(crn.species, np.array(['A', 'B']))
+    np.testing.assert_array_equal(crn.reaction_stoichiometry, np.array([[0, 1], [1, 0], [1, 0]]))
+    np.testing.assert_array_equal(crn.product_stoichiometry, np.array([[1, 0], [0, 1], [0, 0]]))
+    assert crn.species_lookup == {'A': 0, 'B': 1}
+
+    # the caller's array is not modified
+    np.testing.assert_array_equal(reaction_rates, np.array([1.0, 2.0, 3.0, 4.0, 5.0, 0.5]))
+
+def test_reduce_no_reactions():
+    crn = crnpy.create_crn(from_arrays={"species": np.array(['A']), "reaction_rates": np.zeros(0), "reaction_stoichiometry": np.zeros((0, 1), dtype=int), "product_stoichiometry": np.zeros((0, 1), dtype=int)})
+    crn.reduce()
+    assert crn.number_of_reactions == 0
+    assert crn.number_of_species == 0
+
+def test_save_round_trip(crn_obj, crn_text, tmp_path):
+    filename = tmp_path / "crn.txt"
+    crn_obj.save(str(filename))
+    assert filename.read_text() == crn_text
+    loaded = crnpy.create_crn(from_file={"filename": str(filename)})
+    assert str(loaded) == crn_text
+
+def test_tokenize_implicit_vocab(crn_obj):
+    vocab, inv_vocab = create_implicit_vocab(4, 2)
+    stoichiometry_tokens, rate_tokens, initial_concentrations_tokens = crn_obj.tokenize(vocab, 4, 3)
+    np.testing.assert_array_equal(np.array([117, 153, 0]), stoichiometry_tokens)
+
+    crn = crnpy.create_crn(from_tokens={"stoichiometry_tokens": stoichiometry_tokens[:2], "rate_tokens": rate_tokens[:2], "initial_concentrations_tokens": initial_concentrations_tokens[:3], "inv_vocab": inv_vocab})
+    np.testing.assert_array_equal(crn.reaction_stoichiometry, crn_obj.reaction_stoichiometry)
+    np.testing.assert_array_equal(crn.product_stoichiometry, crn_obj.product_stoichiometry)
@@ -99,3 +99,89 @@ def test_convert_arrays_to_crn_text():
     assert s == "#X_1=9.0,X_2=10.6,Y_1=11.0\nX_1 + Y_1->Y_1 + Y_1,5.7\nX_2 + Y_1->Y_1,10.3\n"
 
 
+
+def test_mass_action_jacobian():
+    _t = 0
+    _x = np.array([9.0, 0.0, 11.0])
+    _reaction_rates = np.array([5.7, 10.3, 0.4])
+    _react_stoch = np.array([[1,0,1], [0,1,1], [2,0,0]])
+    _stoch_mat = np.array([[-1,0,1], [0,-1,0], [-2,1,0]])
+    jacobian = utils.mass_action_jacobian(_t, _x, _reaction_rates, _react_stoch, _stoch_mat)
+
+    # central finite differences of the right-hand side
+    eps = 1e-6
+    expected = np.zeros((3, 3))
+    for s in range(3):
+        dx = np.zeros(3)
+        dx[s] = eps
+        expected[:, s] = (utils.stoch_mat_to_mass_action(_t, _x + dx, _reaction_rates, _react_stoch, _stoch_mat) - utils.stoch_mat_to_mass_action(_t, _x - dx, _reaction_rates, _react_stoch, _stoch_mat))/(2*eps)
+
+    np.testing.assert_allclose(jacobian, expected, rtol=1e-6, atol=1e-6)
+
+@pytest.mark.parametrize("method", ["BDF", "Radau", "LSODA"])
+def test_simulate_trajectory_implicit(method):
+    _t_length = 0.01
+    _t_step = 0.0025
+    _reaction_rates = np.array([5.7, 10.3])
+    _react_stoch = np.array([[1,0,1], [0,1,1]])
+    _prod_stoch = np.array([[0,0,2], [0,0,1]])
+    _inits = np.array([9.0, 10.6, 11.0])
+
+    sol_crn = utils.simulate_trajectory(_reaction_rates, _react_stoch, _prod_stoch-_react_stoch, _inits, _t_length, _t_step, method=method)
+    assert sol_crn.y.shape == (3, 4)
+    np.testing.assert_allclose(sol_crn.y, np.array([[9.,  7.618279,  6.326681,  5.162753], [10.6,  7.843389,  5.606759,  3.882952], [11., 12.381721, 13.673319, 14.837247]]), rtol=1e-4)
+
+def test_parse_crn_txt_streams_coo():
+    lines = ["#X_1=9.0, Y_1=11.0, X_2 = 10.6\n", "X_1 + Y_1-> Y_1 + Y_1,5.7\n", "\n", "X_2 + Y_1-> Y_1,10.3\n", "0->X_2,1.5\n", "X_1->0,2\n"]
+    species, reaction_rates, react_stoch, prod_stoch, initial_concs = utils.parse_crn_txt(lines)
+
+    assert species == ['X_1', 'Y_1', 'X_2']
+    assert reaction_rates == [5.7, 10.3, 1.5, 2.0]
+    assert initial_concs == {'X_1': 9.0, 'Y_1': 11.0, 'X_2': 10.6}
+    np.testing.assert_array_equal(react_stoch.toarray(), np.array([[1, 1, 0], [0, 1, 1], [0, 0, 0], [1, 0, 0]]))
+    np.testing.assert_array_equal(prod_stoch.toarray(), np.array([[0, 2, 0], [0, 1, 0], [0, 0, 1], [0, 0, 0]]))
+
+@pytest.mark.parametrize("line, message", [
+    ("X_1 + Y_1 Y_1,5.7", "line 2"),
+    ("X_1->Y_1", "line 2"),
+    ("X_1->Y_1,fast", "line 2"),
+    ("X_1->Y_1->X_2,1.0", "line 2"),
+])
+def test_parse_crn_txt_malformed_reaction(line, message):
+    with pytest.raises(ValueError, match=message):
+        utils.parse_crn_txt(["#X_1=1.0", line])
+
+def test_parse_crn_txt_malformed_concentration():
+    with pytest.raises(ValueError, match="line 1"):
+        utils.parse_crn_txt(["#X_1=1.0,Y_1", "X_1->Y_1,1.0"])
+
+def test_read_crn_txt_round_trip(tmp_path):
+    _species = np.array(['A', 'B'])
+    _reaction_rates = np.array([1.5, 0.25])
+    _react_stoch = np.array([[0, 0], [2, 1]])
+    _prod_stoch = np.array([[1, 0], [0, 0]])
+    _inits = np.array([3.0, 4.0])
+    crn_file = tmp_path / "round_trip.txt"
+    utils.save_crn(crn_file, utils.convert_arrays_to_crn_text(_species, _reaction_rates, _react_stoch, _prod_stoch, _inits))
+
+    species, reaction_rates, react_stoch, prod_stoch, stoch_mat, number_species, number_reactions, initial_concs_vec = utils.read_crn_txt(crn_file)
+    assert species == ['A', 'B']
+    np.testing.assert_array_equal(reaction_rates, _reaction_rates)
+    np.testing.assert_array_equal(react_stoch, _react_stoch)
+    np.testing.assert_array_equal(prod_stoch, _prod_stoch)
+    np.testing.assert_array_equal(initial_concs_vec, _inits)
+
+def test_write_crn_text_streams_lines(tmp_path):
+    _species = np.array(['A', 'B'])
+    _reaction_rates = np.array([1.5, 0.25, 3.0])
+    _react_stoch = np.array([[0, 0], [2, 1], [0, 3]])
+    _prod_stoch = np.array([[1, 0], [0, 0], [1, 1]])
+    _inits = np.array([3.0, 4.0])
+
+    lines = list(utils.iter_crn_text(_species, _reaction_rates, _react_stoch, _prod_stoch, _inits))
+    assert lines == ["#A=3.0,B=4.0\n", "0->A,1.5\n", "A + A + B->0,0.25\n", "B + B + B->A + B,3.0\n"]
+
+    crn_file = tmp_path / "streamed.txt"
+    with open(crn_file, "w") as f:
+        utils.write_crn_text(f, _species, _reaction_rates, _react_stoch, _prod_stoch, _inits)
+    assert crn_file.read_text() == "".join(lines)
@@ -0,0 +1,123 @@
+import crnpy
+import numpy as np
+import pytest
+from crnpy.crn import ensemble
+from crnpy.crn.batch import stack_crns, unstack_batch
+
+@pytest.fixture
+def crn_obj():
+    return crnpy.create_crn(from_arrays={
+        "species": np.array(['X_1', 'X_2', 'Y_1']),
+        "reaction_rates": np.array([5.7, 10.3]),
+        "reaction_stoichiometry": np.array([[1,0,1], [0,1,1]]),
+        "product_stoichiometry": np.array([[0,0,2], [0,0,1]]),
+        "initial_concentrations": np.array([9.0, 10.6, 11.0])
+    })
+
+@pytest.fixture
+def crn_single():
+    return crnpy.create_crn(from_arrays={
+        "species": np.array(['X_1']),
+        "reaction_rates": np.array([1]),
+        "reaction_stoichiometry": np.array([[1]]),
+        "product_stoichiometry": np.array([[0]]),
+        "initial_concentrations": np.array([10.0])
+    })
+
+@pytest.fixture
+def crn_blowup():
+    return crnpy.create_crn(from_arrays={
+        "species": np.array(['X_1']),
+        "reaction_rates": np.array([0.5]),
+        "reaction_stoichiometry": np.array([[1]]),
+        "product_stoichiometry": np.array([[2]]),
+        "initial_concentrations": np.array([9.9e5])
+    })
+
+def test_stack_and_unstack_crns(crn_obj, crn_single):
+    batch = stack_crns([crn_obj, crn_single])
+    assert batch["reaction_stoichiometry"].shape == (2, 2, 3)
+    np.testing.assert_array_equal(batch["number_of_species"], np.array([3, 1]))
+    np.testing.assert_array_equal(batch["number_of_reactions"], np.array([2, 1]))
+    np.testing.assert_array_equal(batch["species"][1], np.array(['X_1', '', '']))
+
+    members = unstack_batch(batch)
+    crn = crnpy.create_crn(from_dict=members[0])
+    assert str(crn) == str(crn_obj)
+    np.testing.assert_array_equal(members[1]["reaction_stoichiometry"], crn_single.reaction_stoichiometry)
+
+def test_stack_crns_too_many_species(crn_obj):
+    with pytest.raises(ValueError):
+        stack_crns([crn_obj], max_number_of_species=2)
+
+def test_integrate_batch_matches_integrate(crn_obj, crn_single):
+    _t_length = 0.1
+    _t_step = 0.0025
+    t, y, blowup = ensemble.integrate_batch([crn_obj, crn_single, crn_obj], _t_length, _t_step)
+
+    assert y.shape == (3, 3, 40)
+    np.testing.assert_array_equal(blowup, np.array([False, False, False]))
+    np.testing.assert_array_equal(t, crn_obj.integrate(_t_length, _t_step).t)
+    np.testing.assert_allclose(y[0], crn_obj.integrate(_t_length, _t_step).y, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(y[1, :1], crn_single.integrate(_t_length, _t_step).y, rtol=1e-5, atol=1e-5)
+    np.testing.assert_array_equal(y[1, 1:], 0)
+
+def test_integrate_batch_blowup(crn_obj, crn_blowup):
+    _t_length = 0.1
+    _t_step = 0.0025
+    t, y, blowup = ensemble.integrate_batch([crn_blowup, crn_obj], _t_length, _t_step, method='BDF')
+
+    np.testing.assert_array_equal(blowup, np.array([True, False]))
+    single = crn_blowup.integrate(_t_length, _t_step)
+    number_of_time_points = single.t.size
+    np.testing.assert_allclose(y[0, :1, :number_of_time_points], single.y, rtol=1e-5, atol=1e-5)
+    assert np.all(np.isnan(y[0, :, number_of_time_points:]))
+    np.testing.assert_allclose(y[1], crn_obj.integrate(_t_length, _t_step).y, rtol=1e-4, atol=1e-5)
+
+def test_integrate_batch_all_blowup(crn_blowup):
+    t, y, blowup = ensemble.integrate_batch([crn_blowup, crn_blowup], 2, 0.0025)
+    assert y.shape == (2, 1, 800)
+    assert blowup.all()
+    assert np.all(np.isnan(y[:, :, -1]))
+
+def test_integrate_batch_solver_failure(crn_obj, monkeypatch):
+    from scipy.optimize import OptimizeResult
+
+    def failing_solve_ivp(fun, t_span, y0, **kwargs):
+        return OptimizeResult(t=np.array([0.0, 0.0025]), y=np.stack([y0, y0], axis=1), status=-1, message='Required step size is less than spacing between numbers.')
+
+    # a failed solve truncates sol.y, which must not be reported as blowup of every member
+    monkeypatch.setattr(ensemble, 'solve_ivp', failing_solve_ivp)
+    with pytest.raises(RuntimeError):
+        ensemble.integrate_batch([crn_obj, crn_obj], 0.01, 0.0025)
+
+def test_integrate_batch_columnar(crn_obj, crn_single):
+    batch = stack_crns([crn_obj, crn_single])
+    t, y, blowup = ensemble.integrate_batch(batch, 0.01, 0.0025)
+    np.testing.assert_allclose(y[0], crn_obj.integrate(0.01, 0.0025).y, rtol=1e-5, atol=1e-5)
+
+def test_distance_matrix_matches_distance_from(crn_obj, crn_single, crn_blowup):
+    crns = [crn_obj, crn_single, crn_blowup, crn_obj]
+    _t_length = 0.1
+    _t_step = 0.0025
+    species = np.asarray(['X_1'])
+
+    mse, mse_ends, change_in_val = ensemble.distance_matrix(crns, species, _t_length, _t_step, processes=1, chunksize=3)
+    assert mse.shape == (4, 4)
+    for i in range(4):
+        for j in range(4):
+            expected = crns[i].distance_from(crns[j], species, _t_length, _t_step)
+            np.testing.assert_allclose((mse[i, j], mse_ends[i, j], change_in_val[i, j]), expected, rtol=1e-6, atol=1e-12)
+
+    assert mse[0, 3] == 0
+    assert mse[0, 2] == np.inf
+
+def test_distance_matrix_process_pool(crn_obj, crn_single):
+    species = np.asarray(['X_1'])
+    serial = ensemble.distance_matrix([crn_obj, crn_single], species, 0.01, 0.0025, processes=1)
+    pooled = ensemble.distance_matrix([crn_obj, crn_single], species, 0.01, 0.0025, processes=2, chunksize=1)
+    np.testing.assert_array_equal(serial, pooled)
+
+def test_distance_matrix_missing_species(crn_obj, crn_single):
+    with pytest.raises(ValueError):
+        ensemble.distance_matrix([crn_obj, crn_single], np.asarray(['X_2']), 0.01, 0.0025, processes=1)
@@ -3,6 +3,7 @@ import numpy as np
 import pytest
 from pathlib import Path
 from crnpy.crn import token
+from crnpy.crn.crn_class import CRN
 
 @pytest.fixture
 def test_crn():
@@ -157,3 +158,13 @@ def test_create_crn_from_tokens():
 
 
 
+
+def test_crn_from_random_batch():
+    crns = CRN.from_random_batch(4, 3, 2, seed=5)
+    assert len(crns) == 4
+    assert crns[0].number_of_species == 3
+    assert crns[0].number_of_reactions == 2
+    assert [crn.fingerprint for crn in crns] == [crn.fingerprint for crn in CRN.from_random_batch(4, 3, 2, seed=5)]
+
+    batch = CRN.from_random_batch(4, 3, 2, seed=5, as_batch=True)
+    np.testing.assert_array_equal(batch["reaction_rates"][2], crns[2].reaction_rates)
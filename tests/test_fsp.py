@@ -0,0 +1,69 @@
+import numpy as np
+import scipy.special as spc
+from crnpy.legacy import fsp, tools
+
+def test_enumerate_states():
+    # null -> A, A -> B, B -> null with at most 2 molecules of each species
+    reactant_matrix = np.array([[0, 0, 1], [1, 0, 0], [0, 1, 0]]);
+    product_matrix = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]]);
+    states = fsp.enumerate_states(np.array([0, 0]), reactant_matrix, product_matrix, np.array([1., 1., 1.]), 2, 3);
+    assert states.shape == (9, 2);
+    assert len({tuple(state) for state in states.tolist()}) == 9;
+
+    # A -> null from 2 molecules only reaches 1 and 0
+    states = fsp.enumerate_states(np.array([2]), np.array([[1, 0]]), np.array([[0, 1]]), np.array([1.]), 1, 10);
+    np.testing.assert_array_equal(states, [[0], [1], [2]]);
+
+def test_cme_generator():
+    # 2A -> null, falling-factorial propensity A*(A-1)
+    states = np.array([[0], [1], [2], [3]]);
+    generator, outflow = fsp.cme_generator(states, np.array([[2, 0]]), np.array([[0, 1]]), np.array([0.5]), 1, 4);
+    expected = np.zeros((4, 4));
+    for i, state in enumerate(states):
+        propensity = 0.5*tools.compute_stoichiometry_terms_stochastic_propensity(np.array([2, 0]), np.append(state, 0), 1);
+        expected[i, i] = -propensity;
+        if propensity > 0:
+            expected[i - 2, i] = propensity;
+    np.testing.assert_allclose(generator.toarray(), expected);
+    np.testing.assert_array_equal(outflow, np.zeros(4));
+    np.testing.assert_allclose(np.sum(generator.toarray(), 0), 0, atol=1e-12);
+
+def test_compute_stationary_distribution_fsp():
+    steady_state = np.array([10]);
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    n_max = 40;
+    n, p, truncation_error = fsp.compute_stationary_distribution_fsp(steady_state, n_max, reactant_matrix, product_matrix, reaction_rates, 1);
+
+    pCME = 1/spc.factorial(n)*pow(10.,n)*np.exp(-10);
+    np.testing.assert_allclose(p[:,0], pCME, atol=1e-10);
+    assert truncation_error < 1e-9;
+
+    # a tight bound cuts off the tail of the distribution, which shows up in the truncation error
+    n, p, truncation_error = fsp.compute_stationary_distribution_fsp(steady_state, 12, reactant_matrix, product_matrix, reaction_rates, 1);
+    assert truncation_error > 0.01;
+    np.testing.assert_allclose(np.sum(p), 1);
+
+def test_compute_transient_distribution_fsp():
+    # null -> A at rate 1, A -> null at rate 0.1 from A = 0: Poisson with mean 10*(1 - exp(-0.1*t))
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    tRun = 5;
+    n, p, truncation_error = fsp.compute_transient_distribution_fsp(tRun, np.array([0]), 30, reactant_matrix, product_matrix, reaction_rates, 1);
+
+    mean = 10*(1 - np.exp(-0.1*tRun));
+    pCME = 1/spc.factorial(n)*pow(mean,n)*np.exp(-mean);
+    np.testing.assert_allclose(p[:,0], pCME, atol=1e-10);
+    assert truncation_error < 1e-9;
+
+    n, p, truncation_error = fsp.compute_transient_distribution_fsp(tRun, np.array([0]), 5, reactant_matrix, product_matrix, reaction_rates, 1);
+    assert abs(truncation_error - (1 - np.sum(p))) < 1e-12;
+    assert truncation_error > 1 - np.sum(pCME[:5]) - 1e-9;
+
+def test_marginal_distribution():
+    states = np.array([[0, 1], [1, 1], [2, 0]]);
+    n, p = fsp.marginal_distribution(states, np.array([0.2, 0.3, 0.5]), 3);
+    np.testing.assert_array_equal(n, [0, 1, 2]);
+    np.testing.assert_allclose(p, [[0.2, 0.5], [0.3, 0.5], [0.5, 0]]);
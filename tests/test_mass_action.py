@@ -0,0 +1,45 @@
+from crnpy.crn import utils
+from crnpy.crn.mass_action import MassActionRHS
+import numpy as np
+import pytest
+
+@pytest.fixture
+def crn_arrays():
+    reaction_rates = np.array([5.7, 10.3, 0.4, 1.2])
+    react_stoch = np.array([[1,0,1], [0,1,1], [2,0,0], [0,0,0]])
+    prod_stoch = np.array([[0,0,2], [0,0,1], [0,1,0], [1,0,0]])
+    return reaction_rates, react_stoch, prod_stoch-react_stoch
+
+def test_mass_action_rhs_matches_dense(crn_arrays):
+    reaction_rates, react_stoch, stoch_mat = crn_arrays
+    rhs = MassActionRHS(reaction_rates, react_stoch, stoch_mat)
+
+    for x in [np.array([9.0, 10.6, 11.0]), np.array([0.0, 2.0, 0.0]), np.array([0.5, 0.0, 3.0])]:
+        np.testing.assert_allclose(rhs(0, x), utils.stoch_mat_to_mass_action(0, x, reaction_rates, react_stoch, stoch_mat))
+
+def test_mass_action_rhs_jacobian_matches_dense(crn_arrays):
+    reaction_rates, react_stoch, stoch_mat = crn_arrays
+    rhs = MassActionRHS(reaction_rates, react_stoch, stoch_mat)
+
+    for x in [np.array([9.0, 10.6, 11.0]), np.array([0.0, 2.0, 0.0]), np.array([0.5, 0.0, 3.0])]:
+        np.testing.assert_allclose(rhs.jacobian(0, x).toarray(), utils.mass_action_jacobian(0, x, reaction_rates, react_stoch, stoch_mat))
+
+def test_mass_action_rhs_stores_nonzeros_only(crn_arrays):
+    reaction_rates, react_stoch, stoch_mat = crn_arrays
+    rhs = MassActionRHS(reaction_rates, react_stoch, stoch_mat)
+
+    np.testing.assert_array_equal(rhs.reaction_idx, np.array([0, 0, 1, 1, 2]))
+    np.testing.assert_array_equal(rhs.species_idx, np.array([0, 2, 1, 2, 0]))
+    np.testing.assert_array_equal(rhs.exponents, np.array([1, 1, 1, 1, 2]))
+    assert rhs.net_change.shape == (3, 4)
+    assert rhs.net_change.nnz == np.count_nonzero(stoch_mat)
+
+def test_mass_action_rhs_with_rates(crn_arrays):
+    reaction_rates, react_stoch, stoch_mat = crn_arrays
+    rhs = MassActionRHS(reaction_rates, react_stoch, stoch_mat)
+    new_rates = 2*reaction_rates
+    new_rhs = rhs.with_rates(new_rates)
+
+    x = np.array([9.0, 10.6, 11.0])
+    np.testing.assert_allclose(new_rhs(0, x), 2*rhs(0, x))
+    assert new_rhs.net_change is rhs.net_change
@@ -0,0 +1,9 @@
+from crnpy.parallel import map_chunks
+
+def _add(a, b):
+    return a + b
+
+def test_map_chunks_in_process_and_pool():
+    chunk_args = [(1, 2), (3, 4), (5, 6)]
+    assert map_chunks(_add, chunk_args, 1) == [3, 7, 11]
+    assert map_chunks(_add, chunk_args, 2) == [3, 7, 11]
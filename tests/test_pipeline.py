@@ -0,0 +1,48 @@
+import numpy as np
+from crnpy.crn import pipeline
+from crnpy.crn.token import create_implicit_vocab
+
+def test_make_training_batch_shapes():
+    vocab, _ = create_implicit_vocab(3, 2)
+    stoichiometry_tokens, rate_tokens, initial_concentrations_tokens, targets = pipeline.make_training_batch(np.random.SeedSequence(0), 4, 3, 2, 0.1, 0.01, vocab, 5, 6, filter_blowup=False)
+    assert stoichiometry_tokens.shape == (4, 6)
+    assert rate_tokens.shape == (4, 6)
+    assert initial_concentrations_tokens.shape == (4, 5)
+    assert targets.shape == (4, 5, 10)
+    assert targets.dtype == np.float32
+    np.testing.assert_allclose(targets[:, :3, 0], initial_concentrations_tokens[:, :3])
+    np.testing.assert_array_equal(targets[:, 3:, :], 0)
+
+def test_make_training_batch_filters_blowup():
+    vocab, _ = create_implicit_vocab(2, 2)
+    # unimolecular reactions with bimolecular products grow exponentially over a long horizon
+    _, _, _, targets = pipeline.make_training_batch(np.random.SeedSequence(3), 16, 2, 3, 50, 1, vocab, 2, 3, reaction_molecularity_ratio={1: 1}, product_molecularity_ratio={2: 1}, filter_blowup=False)
+    blown = np.any(np.isnan(targets), axis=(1, 2))
+    _, _, _, filtered_targets = pipeline.make_training_batch(np.random.SeedSequence(3), 16, 2, 3, 50, 1, vocab, 2, 3, reaction_molecularity_ratio={1: 1}, product_molecularity_ratio={2: 1})
+    assert 0 < np.sum(blown) < 16
+    assert filtered_targets.shape[0] == np.sum(~blown)
+    assert not np.any(np.isnan(filtered_targets))
+
+def test_training_batches_reproducible_across_processes():
+    kwargs = dict(number_of_batches=3, seed=7, filter_blowup=False)
+    inline = list(pipeline.training_batches(4, 3, 2, 0.1, 0.01, processes=1, **kwargs))
+    pooled = list(pipeline.training_batches(4, 3, 2, 0.1, 0.01, processes=2, max_pending_batches=1, **kwargs))
+    assert len(inline) == 3
+    for inline_batch, pooled_batch in zip(inline, pooled):
+        for a, b in zip(inline_batch, pooled_batch):
+            np.testing.assert_array_equal(a, b)
+    assert not np.array_equal(inline[0][0], inline[1][0])
+
+def test_training_batches_endless_stream():
+    stream = pipeline.training_batches(2, 3, 2, 0.1, 0.01, seed=0, processes=2)
+    batches = [next(stream) for _ in range(5)]
+    stream.close()
+    assert len(batches) == 5
+
+def test_training_batches_default_vocab_follows_molecularity():
+    # trimolecular reactants do not fit the bimolecular vocabulary
+    batches = list(pipeline.training_batches(4, 3, 2, 0.1, 0.01, number_of_batches=1, reaction_molecularity_ratio={3: 1}, product_molecularity_ratio={1: 1}, filter_blowup=False, seed=0, processes=1))
+    stoichiometry_tokens = batches[0][0]
+    vocab, _ = create_implicit_vocab(3, 3)
+    assert stoichiometry_tokens.shape == (4, 2)
+    assert np.all(stoichiometry_tokens < vocab.number_of_complexes**2)
@@ -28,4 +28,58 @@ def test_create_stoichiometry_matrices():
 
     res_bimolecular_only = random.create_stoichiometry_matrices(number_of_reactions_bi, number_of_species_bi, molecularity_ratio_bi)
     print(res_bimolecular_only)
-    np.testing.assert_array_equal(res_bimolecular_only, np.array([[0, 1, 1], [0, 1, 0], [0, 1, 1], [0, 0, 2], [0, 0, 0]]))
\ No newline at end of file
+    np.testing.assert_array_equal(res_bimolecular_only, np.array([[0, 1, 1], [0, 1, 0], [0, 1, 1], [0, 0, 2], [0, 0, 0]]))
+
+def test_sample_stoichiometry_matrices_uniform_multisets():
+    rng = np.random.default_rng(0)
+    number_of_reactions = 60000
+    res = random.sample_stoichiometry_matrices(number_of_reactions, 3, {2: 1}, random_state=rng)
+    np.testing.assert_array_equal(np.sum(res, axis=1), 2)
+
+    # every one of the 6 multisets of size 2 from 3 species is equally likely, as in create_stoichiometry_matrices
+    multisets, counts = np.unique(res, axis=0, return_counts=True)
+    assert multisets.shape[0] == 6
+    np.testing.assert_allclose(counts/number_of_reactions, 1/6, atol=0.01)
+
+def test_sample_stoichiometry_matrices_molecularity_ratio():
+    rng = np.random.default_rng(1)
+    res = random.sample_stoichiometry_matrices(30000, 4, {0: 1, 1: 2, 3: 1}, random_state=rng)
+    molecularities, counts = np.unique(np.sum(res, axis=1), return_counts=True)
+    np.testing.assert_array_equal(molecularities, np.array([0, 1, 3]))
+    np.testing.assert_allclose(counts/30000, np.array([0.25, 0.5, 0.25]), atol=0.01)
+
+def test_sample_stoichiometry_matrices_reproducible():
+    res_1 = random.sample_stoichiometry_matrices(10, 5, {0: 1, 1: 1, 2: 1}, random_state=np.random.default_rng(7))
+    res_2 = random.sample_stoichiometry_matrices(10, 5, {0: 1, 1: 1, 2: 1}, random_state=np.random.default_rng(7))
+    np.testing.assert_array_equal(res_1, res_2)
+    assert res_1.dtype == np.int32
+
+def test_create_stoichiometry_matrices_many_species():
+    # enumerating every trimolecular tuple of 3000 species would need billions of tuples
+    np.random.seed(0)
+    res = random.create_stoichiometry_matrices(100, 3000, {3: 1})
+    assert res.shape == (100, 3000)
+    np.testing.assert_array_equal(np.sum(res, axis=1), 3)
+
+def test_create_random_batch_reproducible_across_processes():
+    batch_1 = random.create_random_batch(10, 4, 6, seed=42, processes=1, block_size=3)
+    batch_2 = random.create_random_batch(10, 4, 6, seed=42, processes=2, block_size=3)
+    for key in batch_1:
+        np.testing.assert_array_equal(batch_1[key], batch_2[key])
+
+    assert batch_1["reaction_stoichiometry"].shape == (10, 6, 4)
+    assert batch_1["initial_concentrations"].shape == (10, 4)
+    np.testing.assert_array_equal(batch_1["species"][3], np.array(['S_1', 'S_2', 'S_3', 'S_4']))
+
+    batch_3 = random.create_random_batch(10, 4, 6, seed=43, block_size=3)
+    assert not np.array_equal(batch_1["reaction_rates"], batch_3["reaction_rates"])
+
+def test_create_random_batch_generator_seed():
+    batch_1 = random.create_random_batch(5, 3, 2, seed=np.random.default_rng(0))
+    batch_2 = random.create_random_batch(5, 3, 2, seed=np.random.default_rng(0))
+    np.testing.assert_array_equal(batch_1["reaction_stoichiometry"], batch_2["reaction_stoichiometry"])
+
+def test_create_random_batch_molecularity():
+    batch = random.create_random_batch(50, 5, 4, reaction_molecularity_ratio={2: 1}, product_molecularity_ratio={0: 1}, seed=1)
+    np.testing.assert_array_equal(np.sum(batch["reaction_stoichiometry"], axis=2), 2)
+    np.testing.assert_array_equal(batch["product_stoichiometry"], 0)
@@ -1,5 +1,7 @@
 import numpy as np
-from crnpy.legacy import stochastic
+import pytest
+from time import perf_counter
+from crnpy.legacy import stochastic, tools
 import scipy.special as spc
 
 def test_crn_state_rates_generator():
@@ -333,4 +335,326 @@ def test_crn_state_rates_generator_8():
     state, propensity = stochastic.crn_state_rates_generator(start_state, reactant_matrix, product_matrix, reaction_rates, null_index);
 
     assert(propensity[0] == kbyv2*A0*(A0-1)*(A0-2))
-    assert(state[0][0] == A0-2)
\ No newline at end of file
+    assert(state[0][0] == A0-2)
+
+def test_stochastic_propensity_function():
+    reactant_matrix = np.array([[0, 0, 1], [1, 0, 0], [2, 1, 0], [3, 0, 0]]);
+    reaction_rates = np.array([2., 3., 5., 7.]);
+    null_index = 2;
+    propensities = tools.stochastic_propensity_function(reactant_matrix, reaction_rates, null_index);
+    for state in [np.array([30, 20]), np.array([1, 4]), np.array([0, 0])]:
+        state_w_null = np.append(state, 0);
+        expected = [reaction_rates[i]*tools.compute_stoichiometry_terms_stochastic_propensity(reactant_matrix[i,:], state_w_null, null_index) for i in range(4)];
+        np.testing.assert_array_equal(propensities(state), expected);
+
+def test_gillespie_direct_simulation_matches_gillespie_simulation():
+    start_state = np.array([0]);
+    reactant_matrix = np.array([[1, 0],[0, 1],[2, 0]]);
+    product_matrix = np.array([[0, 1],[1, 0],[1, 0]]);
+    reaction_rates = np.array([0.1, 1, 0.01]);
+    null_index = 1;
+
+    np.random.seed(5);
+    expected = stochastic.gillespie_simulation( 30, start_state, reactant_matrix, product_matrix, reaction_rates, null_index );
+    np.random.seed(5);
+    output = stochastic.gillespie_direct_simulation( 30, start_state, reactant_matrix, product_matrix, reaction_rates, null_index );
+    np.testing.assert_allclose(output[0], expected[0]);
+    np.testing.assert_array_equal(output[1], expected[1]);
+
+    np.random.seed(5);
+    expected = stochastic.gillespie_simulation( 30, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, final_only=True );
+    np.random.seed(5);
+    output = stochastic.gillespie_direct_simulation( 30, start_state, reactant_matrix, product_matrix, reaction_rates, null_index, final_only=True );
+    np.testing.assert_allclose(output[0], expected[0]);
+    np.testing.assert_array_equal(output[1], expected[1]);
+
+def test_gillespie_direct_simulation_global_stream_matches_gillespie_simulation():
+    # consecutive seeded calls reproduce, as the global np.random advances exactly as in gillespie_simulation
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+
+    np.random.seed(5);
+    expected = [stochastic.gillespie_simulation( 10, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1 ) for _ in range(3)];
+    expected_next = np.random.random();
+    np.random.seed(5);
+    output = [stochastic.gillespie_direct_simulation( 10, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1 ) for _ in range(3)];
+    assert np.random.random() == expected_next;
+    for (time, trajectory), (expected_time, expected_trajectory) in zip(output, expected):
+        np.testing.assert_allclose(time, expected_time);
+        np.testing.assert_array_equal(trajectory, expected_trajectory);
+
+def test_gillespie_direct_simulation_buffers_and_absorbing_state():
+    # A -> null from 3000 molecules fires exactly 3000 times, more than the initial buffer, then stops at A = 0
+    reactant_matrix = np.array([[1, 0]]);
+    product_matrix = np.array([[0, 1]]);
+    time, trajectory = stochastic.gillespie_direct_simulation( 1e9, np.array([3000]), reactant_matrix, product_matrix, np.array([1.]), 1, rng=np.random.default_rng(0) );
+    assert time.shape == (3001,);
+    np.testing.assert_array_equal(trajectory[:, 0], np.arange(3000, -1, -1));
+    assert np.all(np.diff(time) > 0);
+    assert time[-1] < 1e9;
+
+def test_indexed_priority_queue():
+    queue = stochastic.IndexedPriorityQueue([5., 3., np.inf, 4.]);
+    assert queue.top() == (1, 3.);
+    queue.update(1, 10.);
+    assert queue.top() == (3, 4.);
+    queue.update(2, 1.);
+    assert queue.top() == (2, 1.);
+    queue.update(2, np.inf);
+    queue.update(3, 6.);
+    order = [];
+    for _ in range(4):
+        reaction, time = queue.top();
+        order.append(reaction);
+        queue.update(reaction, np.inf);
+    assert order[:3] == [0, 3, 1];
+
+def test_reaction_dependency_graph():
+    # null -> A, A -> B, B -> null, C -> C
+    reactant_matrix = np.array([[0, 0, 0, 1], [1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]]);
+    product_matrix = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]);
+    graph = stochastic.reaction_dependency_graph(reactant_matrix, product_matrix, 3);
+    assert graph == [[0, 1], [1, 2], [2], [3]];
+
+def test_reaction_dependency_graph_large_sparse_network():
+    # 8000 conversions A_(i mod 1000) -> A_(i+1 mod 1000), so every reaction depends on 16 others
+    number_of_reactions = 8000;
+    number_of_species = 1000;
+    reactant_matrix = np.zeros([number_of_reactions, number_of_species + 1], dtype=np.int8);
+    product_matrix = np.zeros([number_of_reactions, number_of_species + 1], dtype=np.int8);
+    reactions = np.arange(number_of_reactions);
+    reactant_matrix[reactions, reactions % number_of_species] = 1;
+    product_matrix[reactions, (reactions + 1) % number_of_species] = 1;
+
+    start = perf_counter();
+    graph = stochastic.reaction_dependency_graph(reactant_matrix, product_matrix, number_of_species);
+    assert perf_counter() - start < 5;
+    assert graph[0] == sorted([r for r in range(0, number_of_reactions, number_of_species)] + [r for r in range(1, number_of_reactions, number_of_species)]);
+    assert all(len(dependencies) == 16 for dependencies in graph);
+
+def test_next_reaction_simulation_prod_decay():
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    time, trajectory = stochastic.next_reaction_simulation( 3, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1, rng=np.random.default_rng(1) );
+    assert time[0] == 0 and time[-2] < 3 and time[-1] >= 3;
+    assert np.all(np.abs(np.diff(trajectory[:, 0])) == 1);
+
+    final_time, final_state = stochastic.next_reaction_simulation( 3, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1, final_only=True, rng=np.random.default_rng(1) );
+    assert final_time == time[-1];
+    np.testing.assert_array_equal(final_state, trajectory[-1:]);
+
+def test_next_reaction_simulation_global_stream_is_reproducible():
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    outputs = [];
+    for _ in range(2):
+        np.random.seed(5);
+        first = stochastic.next_reaction_simulation( 10, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1 );
+        second = stochastic.next_reaction_simulation( 10, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1 );
+        outputs.append((first, second));
+    for expected, output in zip(outputs[0], outputs[1]):
+        np.testing.assert_array_equal(output[0], expected[0]);
+        np.testing.assert_array_equal(output[1], expected[1]);
+    # 1 exponential for each event and 2 at the start, none drawn ahead
+    np.random.seed(5);
+    time, trajectory = stochastic.next_reaction_simulation( 10, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1 );
+    np.random.seed(5);
+    np.random.random(time.size + 1);
+    expected_next = np.random.random();
+    np.random.seed(5);
+    stochastic.next_reaction_simulation( 10, np.array([0]), reactant_matrix, product_matrix, reaction_rates, 1 );
+    assert np.random.random() == expected_next;
+
+def test_compute_stationary_distribution_next_reaction_simulation():
+    np.random.seed(5);
+    steady_state = np.array([10]);
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    n_max = 23;
+    n,p = stochastic.compute_stationary_distribution(steady_state, n_max, 200, reactant_matrix, product_matrix, reaction_rates, 1, simulation=stochastic.next_reaction_simulation);
+
+    pCME = 1/spc.factorial(n)*pow(10,n)*np.exp(-10);
+    test_p = abs(np.transpose(p[:,0])- pCME) < 0.05;
+    assert test_p.all();
+
+def test_tau_leaping_simulation_high_copy_number_birth_death():
+    # null -> A at rate 1000, A -> null at rate 1: stationary Poisson(1000)
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([1, 1000.]);
+    time_arr, state_arr = stochastic.tau_leaping_simulation( 1500, np.array([1000]), reactant_matrix, product_matrix, reaction_rates, 1, 5, epsilon=0.01, rng=np.random.default_rng(0) );
+    np.testing.assert_array_equal(time_arr, np.arange(0, 1500, 5));
+    assert state_arr.shape == (300, 1);
+    assert abs(np.mean(state_arr[:, 0]) - 1000) < 10;
+    assert abs(np.var(state_arr[:, 0]) - 1000) < 250;
+
+@pytest.mark.filterwarnings("error")
+def test_tau_leaping_simulation_species_never_consumed():
+    # null -> A, A -> B, where B is never consumed and has g = 0
+    reactant_matrix = np.array([[0, 0, 1], [1, 0, 0]]);
+    product_matrix = np.array([[1, 0, 0], [0, 1, 0]]);
+    time_arr, state_arr = stochastic.tau_leaping_simulation( 10, np.array([500, 0]), reactant_matrix, product_matrix, np.array([500., 1.]), 2, 1, rng=np.random.default_rng(0) );
+    assert np.all(state_arr >= 0);
+    assert np.all(np.diff(state_arr[:, 1]) >= 0);
+
+def test_tau_leaping_simulation_falls_back_to_ssa_near_zero():
+    # A -> null from 5 molecules: every step is an exact SSA step, molecules are removed one by one until none are left
+    time_arr, state_arr = stochastic.tau_leaping_simulation( 50, np.array([5]), np.array([[1, 0]]), np.array([[0, 1]]), np.array([1.]), 1, 1, rng=np.random.default_rng(1) );
+    assert state_arr[0, 0] == 5;
+    assert np.all(np.diff(state_arr[:, 0]) <= 0);
+    assert state_arr[-1, 0] == 0;
+    assert np.all(state_arr >= 0);
+
+def test_compute_stationary_distribution_ensemble():
+    steady_state = np.array([10]);
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    n_max = 23;
+    n,p = stochastic.compute_stationary_distribution_ensemble(steady_state, n_max, 2000, 20, reactant_matrix, product_matrix, reaction_rates, 1, seed=0, processes=1);
+
+    pCME = 1/spc.factorial(n)*pow(10,n)*np.exp(-10);
+    np.testing.assert_array_equal(n, np.arange(0,n_max,1));
+    assert np.sum(p) <= 1;
+    test_p = abs(np.transpose(p[:,0])- pCME) < 0.025;
+    assert test_p.all();
+
+def test_compute_stationary_distribution_ensemble_reproducible_across_processes():
+    steady_state = np.array([10, 0]);
+    reactant_matrix = np.array([[1, 0, 0],[0, 0, 1],[1, 0, 0],[0, 1, 0]]);
+    product_matrix = np.array([[0, 0, 1],[1, 0, 0],[0, 1, 0],[0, 0, 1]]);
+    reaction_rates = np.array([0.1, 1, 0.5, 1]);
+    args = (steady_state, 30, 50, 5, reactant_matrix, product_matrix, reaction_rates, 2);
+    n_serial, p_serial = stochastic.compute_stationary_distribution_ensemble(*args, seed=7, processes=1, block_size=8);
+    n_pool, p_pool = stochastic.compute_stationary_distribution_ensemble(*args, seed=7, processes=2, block_size=8, simulation=stochastic.gillespie_direct_simulation);
+    np.testing.assert_array_equal(p_serial, p_pool);
+    np.testing.assert_allclose(np.sum(p_serial, 0), [1, 1]);
+
+    n_nrm, p_nrm = stochastic.compute_stationary_distribution_ensemble(*args, seed=7, processes=2, block_size=8, simulation=stochastic.next_reaction_simulation);
+    assert p_nrm.shape == p_serial.shape;
+
+def test_stochastic_propensity_function_batched_states():
+    reactant_matrix = np.array([[0, 0, 1], [1, 0, 0], [2, 1, 0]]);
+    reaction_rates = np.array([2., 3., 5.]);
+    propensities = tools.stochastic_propensity_function(reactant_matrix, reaction_rates, 2);
+    states = np.array([[30, 20], [1, 4], [0, 0]]);
+    result = propensities(states);
+    assert result.shape == (3, 3);
+    for replica in range(3):
+        np.testing.assert_array_equal(result[replica], propensities(states[replica]));
+
+def test_gillespie_replica_simulation():
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    time_arr, state_arr = stochastic.gillespie_replica_simulation( 50, np.array([10]), reactant_matrix, product_matrix, reaction_rates, 1, 4000, rng=np.random.default_rng(0) );
+    assert time_arr.shape == (4000,);
+    assert state_arr.shape == (4000, 1);
+    assert np.all(time_arr >= 50);
+
+    n_max = 23;
+    n = np.arange(0, n_max, 1);
+    p = np.bincount(state_arr[:, 0], minlength=n_max)[:n_max] / 4000;
+    pCME = 1/spc.factorial(n)*pow(10,n)*np.exp(-10);
+    test_p = abs(p - pCME) < 0.02;
+    assert test_p.all();
+
+def test_gillespie_replica_simulation_retires_absorbed_replicas():
+    # A -> null from different start states: every replica stops when it runs out of A
+    start_state = np.array([[0], [1], [5]]);
+    time_arr, state_arr = stochastic.gillespie_replica_simulation( 1e9, start_state, np.array([[1, 0]]), np.array([[0, 1]]), np.array([1.]), 1, 3, rng=np.random.default_rng(2) );
+    np.testing.assert_array_equal(state_arr, np.zeros((3, 1)));
+    assert time_arr[0] == 0;
+    assert np.all(time_arr[1:] > 0) and np.all(time_arr < 1e9);
+
+def test_resample_to_fixed_step_matches_event_scan():
+    rng = np.random.default_rng(4);
+    time_in = np.concatenate([[0], np.cumsum(rng.exponential(0.3, 200))]);
+    traj = rng.integers(0, 50, size=(201, 3));
+    time_arr, state_arr = stochastic.resample_to_fixed_step(time_in, traj, 0.1);
+
+    time = 0;
+    for i in range(time_arr.size):
+        assert time_arr[i] == time;
+        expected = traj[0] if i == 0 else traj[np.max(np.argwhere(time_in < time))];
+        np.testing.assert_array_equal(state_arr[i], expected);
+        time = time + 0.1;
+
+def test_resample_all_trajectories():
+    t1 = np.array([0, 1, 2 ,3, 4]);
+    t3 = np.array([0, 1, 2, 4.1]);
+    test_trajs = [(t1, np.array([[0,1], [1,1], [0,1], [1,1], [2,1] ]) ),
+                  (t3, np.array([[0,2], [2,2], [1,2], [2,2] ]) )];
+    resampled_time_axis = np.array([0, 0.5, 1, 1.5, 2, 2.5 ,3, 3.5, 4, 5]);
+    out = np.full((2, 10, 2), -1.);
+    result = stochastic.resample_all_trajectories(test_trajs, resampled_time_axis, out=out);
+    assert result is out;
+    np.testing.assert_array_equal(result[0, :, 0], [0, 0, 1, 1, 0, 0, 1, 1, 2, 2]);
+    np.testing.assert_array_equal(result[1, :, 0], [0, 0, 2, 2, 1, 1, 1, 1, 1, 2]);
+    np.testing.assert_array_equal(result[:, :, 1], [[1]*10, [2]*10]);
+
+    for trajectory_index in range(2):
+        expected = stochastic.interpolate_all_states(test_trajs[trajectory_index], resampled_time_axis[:9]);
+        np.testing.assert_array_equal(result[trajectory_index, :9, :], np.transpose(expected));
+
+def test_gillespie_occupancy_simulation():
+    steady_state = np.array([10]);
+    reactant_matrix = np.array([[1, 0],[0, 1]]);
+    product_matrix = np.array([[0, 1],[1, 0],]);
+    reaction_rates = np.array([0.1, 1]);
+    n_max = 23;
+    accumulator, final_state = stochastic.gillespie_occupancy_simulation( 5000, steady_state, reactant_matrix, product_matrix, reaction_rates, 1, n_max, burn_in=100, rng=np.random.default_rng(0) );
+    assert abs(accumulator.total_time - 4900) < 1e-6;
+
+    n, p = accumulator.distribution();
+    np.testing.assert_array_equal(n, np.arange(0,n_max,1));
+    pCME = 1/spc.factorial(n)*pow(10,n)*np.exp(-10);
+    test_p = abs(np.transpose(p[:,0])- pCME) < 0.01;
+    assert test_p.all();
+
+    # continuing the run from the final state adds to the same accumulator
+    accumulator, final_state = stochastic.gillespie_occupancy_simulation( 1000, final_state, reactant_matrix, product_matrix, reaction_rates, 1, n_max, accumulator=accumulator, rng=np.random.default_rng(1) );
+    assert abs(accumulator.total_time - 5900) < 1e-6;
+
+def test_gillespie_occupancy_simulation_absorbing_state_and_joint():
+    # A + B -> null from (2, 3) fires twice, then (0, 1) is held until tRun
+    accumulator, final_state = stochastic.gillespie_occupancy_simulation( 100, np.array([2, 3]), np.array([[1, 1, 0]]), np.array([[0, 0, 1]]), np.array([1.]), 2, 5, joint=True, rng=np.random.default_rng(0) );
+    np.testing.assert_array_equal(final_state, [0, 1]);
+    assert abs(accumulator.total_time - 100) < 1e-9;
+    joint = accumulator.joint_distribution();
+    assert set(joint) == {(2, 3), (1, 2), (0, 1)};
+    assert abs(sum(joint.values()) - 1) < 1e-12;
+    n, p = accumulator.distribution();
+    np.testing.assert_allclose(p[0, 0] + p[1, 0] + p[2, 0], 1);
+    assert p[0, 0] == joint[(0, 1)];
+
+def test_occupancy_accumulator_merge_save_load(tmp_path):
+    first = stochastic.OccupancyAccumulator(3, 2, joint=True);
+    first.add(np.array([0, 1]), 1.5);
+    first.add(np.array([2, 5]), 0.5);
+    second = stochastic.OccupancyAccumulator(3, 2, joint=True);
+    second.add(np.array([0, 1]), 2.0);
+
+    first.merge(second);
+    assert first.total_time == 4.0;
+    np.testing.assert_array_equal(first.counts, [[3.5, 0], [0, 3.5], [0.5, 0]]);
+    np.testing.assert_array_equal(first.overflow, [0, 0.5]);
+    assert first.joint == {(0, 1): 3.5, (2, 5): 0.5};
+
+    first.save(tmp_path / 'checkpoint.npz');
+    loaded = stochastic.OccupancyAccumulator.load(tmp_path / 'checkpoint.npz');
+    np.testing.assert_array_equal(loaded.counts, first.counts);
+    np.testing.assert_array_equal(loaded.overflow, first.overflow);
+    assert loaded.total_time == first.total_time;
+    assert loaded.joint == first.joint;
+
+def test_resample_all_trajectories_before_first_event():
+    test_trajs = [(np.array([1., 2.]), np.array([[0], [1]]))];
+    with pytest.raises(ValueError):
+        stochastic.resample_all_trajectories(test_trajs, np.array([0.5, 1.5]));
+    result = stochastic.resample_all_trajectories(test_trajs, np.array([1., 1.5, 2., 2.5]), strictly_before=True);
+    np.testing.assert_array_equal(result[0, :, 0], [0, 0, 0, 1]);
@@ -0,0 +1,115 @@
+import crnpy
+import numpy as np
+import pytest
+from crnpy.crn.store import CRNStore
+from crnpy.crn.batch import stack_crns
+
+@pytest.fixture
+def crns():
+    np.random.seed(3)
+    crn_obj = crnpy.create_crn(from_arrays={
+        "species": np.array(['X_1', 'X_2', 'Y_1']),
+        "reaction_rates": np.array([5.7, 10.3]),
+        "reaction_stoichiometry": np.array([[1,0,1], [0,1,1]]),
+        "product_stoichiometry": np.array([[0,0,2], [0,0,1]]),
+        "initial_concentrations": np.array([9.0, 10.6, 11.0])
+    })
+    return [crn_obj] + [crnpy.create_crn(from_random={"number_of_species": 4, "number_of_reactions": 5}) for _ in range(4)]
+
+def assert_same_crn(a, b):
+    np.testing.assert_array_equal(a.species, b.species)
+    np.testing.assert_array_equal(a.reaction_rates, b.reaction_rates)
+    np.testing.assert_array_equal(a.reaction_stoichiometry, b.reaction_stoichiometry)
+    np.testing.assert_array_equal(a.product_stoichiometry, b.product_stoichiometry)
+    np.testing.assert_array_equal(a.initial_concentrations, b.initial_concentrations)
+
+def test_store_append_and_read(crns, tmp_path):
+    store = CRNStore(str(tmp_path / "store"), mode='w')
+    store.append(crns[:2])
+    store.append(crns[2:])
+    assert len(store) == 5
+
+    reader = CRNStore(str(tmp_path / "store"))
+    assert len(reader) == 5
+    for i, crn in enumerate(crns):
+        assert_same_crn(reader[i], crn)
+    assert_same_crn(reader[-1], crns[-1])
+    assert [c.fingerprint for c in reader[1:3]] == [c.fingerprint for c in crns[1:3]]
+
+def test_store_array_views_are_zero_copy(crns, tmp_path):
+    store = CRNStore(str(tmp_path / "store"), mode='w')
+    store.append(crns)
+
+    views = CRNStore(str(tmp_path / "store")).arrays(0)
+    np.testing.assert_array_equal(views["reaction_rates"], crns[0].reaction_rates)
+    np.testing.assert_array_equal(views["species"], crns[0].species)
+    np.testing.assert_array_equal(views["entry_reactant"], np.array([1, 1, 1, 1]))
+    np.testing.assert_array_equal(views["entry_product"], np.array([0, 2, 0, 1]))
+    assert isinstance(views["reaction_rates"].base, np.memmap) or isinstance(views["reaction_rates"], np.memmap)
+
+    with pytest.raises(IndexError):
+        CRNStore(str(tmp_path / "store")).arrays(5)
+
+def test_store_array_views_of_slice(crns, tmp_path):
+    store = CRNStore(str(tmp_path / "store"), mode='w')
+    store.append(crns)
+
+    views = store.arrays(slice(1, 4))
+    assert isinstance(views["reaction_rates"].base, np.memmap) or isinstance(views["reaction_rates"], np.memmap)
+    np.testing.assert_array_equal(views["reaction_offsets"], [0, 5, 10, 15])
+    np.testing.assert_array_equal(views["species_offsets"], [0, 4, 8, 12])
+    for i, crn in enumerate(crns[1:4]):
+        np.testing.assert_array_equal(views["reaction_rates"][views["reaction_offsets"][i]:views["reaction_offsets"][i+1]], crn.reaction_rates)
+        np.testing.assert_array_equal(views["species"][views["species_offsets"][i]:views["species_offsets"][i+1]], crn.species)
+        single = store.arrays(i + 1)
+        entries = slice(views["entry_offsets"][i], views["entry_offsets"][i+1])
+        np.testing.assert_array_equal(views["entry_reactant"][entries], single["entry_reactant"])
+
+    empty = store.arrays(slice(3, 3))
+    assert empty["reaction_rates"].size == 0
+    np.testing.assert_array_equal(empty["entry_offsets"], [0])
+    with pytest.raises(ValueError):
+        store.arrays(slice(0, 5, 2))
+
+def test_store_append_crn_without_reactions(crns, tmp_path):
+    empty = crnpy.create_crn(from_arrays={
+        "species": np.array(['X_1', 'X_2']),
+        "reaction_rates": np.zeros(0),
+        "reaction_stoichiometry": np.zeros((0, 2), dtype=int),
+        "product_stoichiometry": np.zeros((0, 2), dtype=int),
+        "initial_concentrations": np.array([1.0, 2.0])
+    })
+    store = CRNStore(str(tmp_path / "store"), mode='w')
+    store.append([crns[0], empty, crns[1]])
+
+    reader = CRNStore(str(tmp_path / "store"))
+    assert len(reader) == 3
+    assert reader[1].reaction_stoichiometry.shape == (0, 2)
+    for stored, crn in zip(reader, [crns[0], empty, crns[1]]):
+        assert_same_crn(stored, crn)
+
+def test_store_append_mode_and_columnar_batch(crns, tmp_path):
+    path = str(tmp_path / "store")
+    CRNStore(path, mode='a').append(stack_crns(crns[:3]))
+    store = CRNStore(path, mode='a')
+    store.append(crns[3:])
+    assert len(store) == 5
+    for i, crn in enumerate(crns):
+        assert_same_crn(store[i], crn)
+
+def test_store_read_only(crns, tmp_path):
+    path = str(tmp_path / "store")
+    CRNStore(path, mode='w')
+    with pytest.raises(ValueError):
+        CRNStore(path).append(crns)
+
+def test_store_drops_interrupted_append(crns, tmp_path):
+    path = str(tmp_path / "store")
+    CRNStore(path, mode='w').append(crns[:2])
+    with open(str(tmp_path / "store" / "reaction_rates.bin"), 'ab') as f:
+        f.write(np.ones(3).tobytes())
+
+    store = CRNStore(path, mode='a')
+    store.append(crns[2:])
+    for i, crn in enumerate(crns):
+        assert_same_crn(store[i], crn)
@@ -1,4 +1,5 @@
 from crnpy.crn import token
+import pytest
 import numpy as np
 
 def test_all_reaction_tuples():
@@ -46,3 +47,145 @@ def test_parse_tuples_into_matrix():
     np.testing.assert_array_equal(react_stoich, np.array([[0, 0], [2, 0], [0, 0], [0, 0]]))
     np.testing.assert_array_equal(product_stoich, np.array([[0, 0], [0, 1], [1, 0], [0, 0]]))
 
+
+def test_complex_rank_and_unrank():
+    for number_of_species, molecularity in [(1, 1), (2, 2), (3, 3), (5, 2)]:
+        all_combs = token.iterate_all_molecularity_tuples(number_of_species, molecularity)
+        complexes = [c for n in range(molecularity + 1) for c in all_combs[n]]
+        assert len(complexes) == token.number_of_complexes(number_of_species, molecularity)
+        for rank, c in enumerate(complexes):
+            assert token.complex_rank(c, number_of_species) == rank
+            assert token.complex_unrank(rank, number_of_species) == c
+
+def test_create_implicit_vocab_matches_create_vocab():
+    for number_of_species, molecularity in [(1, 1), (3, 2), (4, 3)]:
+        vocab, inv_vocab = token.create_vocab(number_of_species, molecularity)
+        implicit_vocab, implicit_inv_vocab = token.create_implicit_vocab(number_of_species, molecularity)
+        assert len(implicit_vocab) == len(vocab)
+        assert len(implicit_inv_vocab) == len(inv_vocab)
+        for r, i in vocab.items():
+            assert implicit_vocab[r] == i
+            assert implicit_inv_vocab[i] == r
+        assert list(implicit_vocab) == list(vocab)
+        assert list(implicit_inv_vocab) == list(inv_vocab)
+
+def test_implicit_vocab_large_and_missing_keys():
+    vocab, inv_vocab = token.create_implicit_vocab(1000, 2)
+    assert len(vocab) == 501501**2
+    r = ((3, 999), (0, 0))
+    assert inv_vocab[vocab[r]] == r
+    assert r in vocab
+    assert ((1, 0), ()) not in vocab
+    assert ((1000,), ()) not in vocab
+    assert ((1, 1, 1), ()) not in vocab
+    assert len(vocab)*2 not in inv_vocab
+    assert -1 not in inv_vocab
+    assert inv_vocab.get(np.int64(1)) == ((), (0,))
+
+def test_complex_ranks_matches_complex_rank():
+    number_of_species, molecularity = 4, 3
+    all_combs = token.iterate_all_molecularity_tuples(number_of_species, molecularity)
+    complexes = [c for n in range(molecularity + 1) for c in all_combs[n]]
+    stoichiometry = np.zeros((len(complexes), number_of_species), dtype=np.int32)
+    for i, c in enumerate(complexes):
+        for s in c:
+            stoichiometry[i, s] += 1
+    np.testing.assert_array_equal(token.complex_ranks(stoichiometry, number_of_species, molecularity), np.arange(len(complexes)))
+
+def test_tokenize_batch_matches_tokenize():
+    from crnpy.crn.crn_class import CRN
+    crns = CRN.from_random_batch(20, 5, 6, seed=3) + [CRN.from_random(3, 2)]
+    vocab, inv_vocab = token.create_implicit_vocab(6, 2)
+    stoichiometry_tokens, rate_tokens, initial_concentrations_tokens = token.tokenize_batch(crns, vocab, 6, 8)
+
+    assert stoichiometry_tokens.shape == (21, 8)
+    assert stoichiometry_tokens.dtype == np.int32
+    assert rate_tokens.dtype == np.float32
+    assert initial_concentrations_tokens.shape == (21, 6)
+    for b, crn in enumerate(crns):
+        expected_tokens, expected_rates, expected_inits = crn.tokenize(vocab, 6, 8)
+        np.testing.assert_array_equal(stoichiometry_tokens[b], expected_tokens)
+        np.testing.assert_allclose(rate_tokens[b], expected_rates, rtol=1e-6)
+        np.testing.assert_allclose(initial_concentrations_tokens[b], expected_inits, rtol=1e-6)
+
+    # a columnar batch gives the same tokens
+    batch = CRN.from_random_batch(20, 5, 6, seed=3, as_batch=True)
+    batch_tokens, _, _ = token.tokenize_batch(batch, vocab, 6, 8)
+    np.testing.assert_array_equal(batch_tokens, stoichiometry_tokens[:20])
+
+def test_tokenize_batch_errors():
+    from crnpy.crn.crn_class import CRN
+    crns = CRN.from_random_batch(2, 5, 6, seed=3)
+    vocab, inv_vocab = token.create_vocab(5, 2)
+    with pytest.raises(TypeError):
+        token.tokenize_batch(crns, vocab, 5, 6)
+    with pytest.raises(ValueError):
+        token.tokenize_batch(crns, token.ReactionVocab(5, 1), 5, 6)
+    with pytest.raises(ValueError):
+        token.tokenize_batch(crns, token.ReactionVocab(5, 2), 5, 5)
+    # len(vocab) > 2**63, whose ids would wrap around in int64
+    with pytest.raises(ValueError):
+        token.tokenize_batch(crns, token.ReactionVocab(10000, 3), 5, 6)
+
+def test_binomial_table_overflow():
+    assert token._binomial_table(4, 2)[4, 2] == 6
+    with pytest.raises(ValueError):
+        token._binomial_table(100, 50)
+
+def test_complex_table():
+    table = token.complex_table(np.arange(6), 2, 2)
+    np.testing.assert_array_equal(table, np.array([[-1, -1], [0, -1], [1, -1], [0, 0], [0, 1], [1, 1]]))
+    # ranks of a vocabulary far too large to enumerate
+    table = token.complex_table([0, token.complex_rank((7, 9999, 9999), 10000)], 10000, 3)
+    np.testing.assert_array_equal(table, np.array([[-1, -1, -1], [7, 9999, 9999]]))
+
+def test_parse_tokens_into_matrices_batch_matches_parse_tuples_into_matrix():
+    vocab, inv_vocab = token.create_implicit_vocab(3, 2)
+    rng = np.random.default_rng(0)
+    tokens = rng.integers(0, len(vocab), size=(5, 4))
+    react_stoich, product_stoich = token.parse_tokens_into_matrices_batch(tokens, vocab, 3)
+    assert react_stoich.dtype == np.int32
+    for b in range(5):
+        expected_react, expected_prod = token.parse_tuples_into_matrix(tokens[b].tolist(), inv_vocab, 4, 3)
+        np.testing.assert_array_equal(react_stoich[b], expected_react)
+        np.testing.assert_array_equal(product_stoich[b], expected_prod)
+
+    with pytest.raises(ValueError):
+        token.parse_tokens_into_matrices_batch(np.array([[len(vocab)]]), vocab, 3)
+    with pytest.raises(ValueError):
+        token.parse_tokens_into_matrices_batch(np.array([[vocab[((2,), ())]]]), vocab, 2)
+
+def test_detokenize_batch_round_trip():
+    from crnpy.crn.crn_class import CRN
+    crns = CRN.from_random_batch(6, 4, 5, seed=11)
+    vocab, inv_vocab = token.create_implicit_vocab(4, 2)
+    stoichiometry_tokens, rate_tokens, initial_concentrations_tokens = token.tokenize_batch(crns, vocab, 4, 7)
+
+    decoded = CRN.from_tokens_batch(stoichiometry_tokens, rate_tokens, initial_concentrations_tokens, vocab)
+    for crn, decoded_crn in zip(crns, decoded):
+        # reactions that tokenize to the padding token (0 -> 0) are stripped
+        kept = np.any(crn.reaction_stoichiometry != 0, axis=1) | np.any(crn.product_stoichiometry != 0, axis=1)
+        np.testing.assert_array_equal(decoded_crn.reaction_stoichiometry, crn.reaction_stoichiometry[kept])
+        np.testing.assert_array_equal(decoded_crn.product_stoichiometry, crn.product_stoichiometry[kept])
+        np.testing.assert_allclose(decoded_crn.reaction_rates, crn.reaction_rates[kept], rtol=1e-6)
+        np.testing.assert_array_equal(decoded_crn.species, crn.species)
+
+def test_detokenize_batch_strips_padding():
+    vocab, inv_vocab = token.create_implicit_vocab(3, 2)
+    stoichiometry_tokens = np.array([[0, 69, 0, 83], [0, 0, 0, 0]])
+    rate_tokens = np.array([[9.0, 1.0, 9.0, 10.0], [1.0, 1.0, 1.0, 1.0]])
+    batch = token.detokenize_batch(stoichiometry_tokens, rate_tokens, None, vocab)
+
+    np.testing.assert_array_equal(batch["number_of_reactions"], np.array([2, 0]))
+    np.testing.assert_array_equal(batch["reaction_rates"], np.array([[1.0, 10.0], [0.0, 0.0]]))
+    np.testing.assert_array_equal(batch["reaction_stoichiometry"][0], np.array([[1,0,1], [0,1,1]]))
+    np.testing.assert_array_equal(batch["product_stoichiometry"][0], np.array([[0,0,2], [0,0,1]]))
+    np.testing.assert_array_equal(batch["initial_concentrations"], np.ones((2, 3)))
+
+def test_detokenize_batch_large_vocab():
+    # only the complexes present in the batch are unranked, so a vocabulary with ~2.5e11 ids decodes immediately
+    vocab, inv_vocab = token.create_implicit_vocab(1000, 3)
+    stoichiometry_tokens = np.array([[vocab[((0, 1), (2, 2, 3))], vocab[((3,), ())]]])
+    batch = token.detokenize_batch(stoichiometry_tokens, np.array([[1.0, 2.0]]), np.ones((1, 4)), vocab)
+    np.testing.assert_array_equal(batch["reaction_stoichiometry"][0], np.array([[1, 1, 0, 0], [0, 0, 0, 1]]))
+    np.testing.assert_array_equal(batch["product_stoichiometry"][0], np.array([[0, 0, 2, 1], [0, 0, 0, 0]]))